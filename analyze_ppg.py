@@ -1,50 +1,366 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.signal import butter, filtfilt, find_peaks
+import pandas as pd
+from scipy.signal import butter, find_peaks, sosfilt, sosfilt_zi, sosfiltfilt
+
+from hrv import beat_intervals, sliding_hrv, window_stats
+from ppg_quality import gated_peaks, signal_quality, sqi_params
+from ppg_session import SessionReader
 
 # 🔹 Configuration Parameters
-SAMPLING_RATE = 128  # Hz
+SAMPLING_RATE = 128  # Hz (fallback when the rate can't be estimated from the timestamps)
 TIME_WINDOW = 2  # Seconds for initial processing
 LOWCUT = 0.5  # Hz (Low cutoff for band-pass filter)
 HIGHCUT = 3.0  # Hz (High cutoff for band-pass filter)
+FILTER_ORDER = 3
+PEAK_PROMINENCE = 0.3
+MIN_IBI = 0.33  # s, plausible inter-beat interval range used for the quality score
+MAX_IBI = 2.0  # s
+HRV_WINDOW = 60  # s, sliding HRV window
+HRV_STEP = 5  # s
+FILTER_CHUNK = 1 << 20  # samples; longer recordings are band-passed chunk by chunk
+
+DEVICE_CLOCK_HZ = 32768.0  # Shimmer timestamp clock
+TICK_WRAP = 2 ** 24  # Shimmer timestamps are 24-bit
+
+DATA_ROOT = "./data"
+DEFAULT_FILE = "./data/test/participant_test_ppg_data.csv"
+# Batch outputs live under the study root (--root); these are the ./data defaults.
+CACHE_DIRNAME = os.path.join(".cache", "analyze_ppg")
+SUMMARY_NAME = "ppg_summary.csv"
+CACHE_DIR = os.path.join(DATA_ROOT, CACHE_DIRNAME)
+SUMMARY_FILE = os.path.join(DATA_ROOT, SUMMARY_NAME)
+CACHE_VERSION = 5
+SIDECAR_SUFFIX = ".npz"  # parsed copy of a CSV recording, next to it
+
+# 🔹 Session phases. Their bounds are measured per session from the marker log and
+# the Stroop result files (epochs.phase_bounds); a phase without bounds gets empty columns.
+PHASES = ("stroop_before", "break", "meditation", "stroop_after")
+
+FILE_PATTERN = re.compile(r"participant_(?P<participant>.+?)_ppg_(?:data\.csv|session\.bin)$")
+
+
+def analysis_params():
+    """Everything that changes the per-file result; part of the cache key."""
+    return {
+        "version": CACHE_VERSION,
+        "lowcut": LOWCUT,
+        "highcut": HIGHCUT,
+        "order": FILTER_ORDER,
+        "prominence": PEAK_PROMINENCE,
+        "ibi_range": [MIN_IBI, MAX_IBI],
+        "hrv": [HRV_WINDOW, HRV_STEP],
+        "sqi": sqi_params(),
+        "phases": PHASES,
+    }
+
+
+# 🔹 0. Load a recording (CSV from ppg.py's CSV mode or a binary session file)
+def ticks_to_seconds(ticks):
+    """Unwrap 24-bit Shimmer device ticks and convert them to seconds."""
+    ticks = np.asarray(ticks, dtype=np.int64)
+    wraps = np.concatenate(([0], np.cumsum(np.diff(ticks) < 0)))
+    return (ticks + wraps * TICK_WRAP) / DEVICE_CLOCK_HZ
+
+
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+def parse_ppg_csv(path):
+    """Both columns of a ppg.py CSV in one pass of pandas' C parser, time in seconds."""
+    frame = pd.read_csv(path, usecols=[0, 1], header=0, names=["time", "ppg"],
+                        dtype={"time": np.float64, "ppg": np.float64}, engine="c")
+    # A recording interrupted mid-write can end in a truncated line.
+    frame = frame.dropna()
+    time = frame["time"].to_numpy()
+    ppg = frame["ppg"].to_numpy()
+    # CSV mode logs raw device ticks; older files may already be in seconds.
+    if len(time) > 1 and np.median(np.diff(time)) > 1:
+        time = ticks_to_seconds(time)
+    return time, ppg
+
+
+def load_ppg_csv(path):
+    """parse_ppg_csv, reusing a .npz sidecar while the CSV's mtime and size are unchanged."""
+    stat = os.stat(path)
+    signature = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    sidecar = sidecar_path(path)
+    try:
+        with np.load(sidecar) as cached:
+            if np.array_equal(cached["signature"], signature):
+                return cached["time"], cached["ppg"]
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        pass  # missing, stale layout, empty or truncated sidecar: parse the CSV again
+    time, ppg = parse_ppg_csv(path)
+    tmp = f"{sidecar}.{os.getpid()}.tmp.npz"
+    try:
+        # Written under a temporary name and renamed, so a crash never leaves a partial sidecar.
+        np.savez(tmp, signature=signature, time=time, ppg=ppg)
+        os.replace(tmp, sidecar)
+    except OSError:
+        # Read-only or full data directory; the parsed arrays are still good.
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return time, ppg
+
+
+def load_ppg(path):
+    """Return (time in seconds from the first sample, PPG values, sampling rate)."""
+    if path.endswith(".bin"):
+        reader = SessionReader(path)
+        time = np.asarray(reader.records["device_time"], dtype=np.float64)
+        ppg = np.asarray(reader.records["ppg"], dtype=np.float64)
+        fs = reader.sampling_rate
+    else:
+        time, ppg = load_ppg_csv(path)
+        fs = None
+    if len(time) == 0:
+        return time, ppg, fs or SAMPLING_RATE
+    time = time - time[0]
+    if not fs:
+        step = np.median(np.diff(time)) if len(time) > 1 else 0
+        fs = 1.0 / step if step > 0 else SAMPLING_RATE
+    return time, ppg, fs
 
-# 🔹 Simulated Raw PPG Data (Replace with actual Shimmer PPG readings)
-ppg_signal = np.loadtxt("./data/test/participant_test_ppg_data.csv", delimiter=",", skiprows=1, usecols=1)
-time = np.loadtxt("./data/test/participant_test_ppg_data.csv", delimiter=",", skiprows=1, usecols=0)
-    
 
 # 🔹 1. Apply Band-Pass Filter
-def bandpass_filter(signal, lowcut, highcut, fs, order=3):
-    nyquist = 0.5 * fs
-    low = lowcut / nyquist
-    high = highcut / nyquist
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, signal)
+@lru_cache(maxsize=64)
+def bandpass_sos(lowcut, highcut, fs, order=3):
+    """Butterworth band-pass in SOS form, designed once per (band, rate, order)."""
+    return butter(order, [lowcut, highcut], btype="band", fs=fs, output="sos")
+
+
+def sosfiltfilt_chunked(sos, signal, chunk_size=FILTER_CHUNK):
+    """Zero-phase filtering equivalent to scipy's sosfiltfilt (odd padding), in chunks.
+
+    The forward pass runs chunk by chunk with the filter state carried across
+    chunk boundaries and writes into the output array; the backward pass then runs
+    over that array in reverse, again chunk by chunk, in place. Apart from the
+    output, memory is bounded by ``chunk_size`` regardless of the recording length,
+    and ``signal`` may be a memmap.
+    """
+    n = len(signal)
+    n_taps = 2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+    padlen = 3 * n_taps
+    if n <= padlen:
+        raise ValueError(f"signal needs more than {padlen} samples for zero-phase filtering")
+    zi_unit = sosfilt_zi(sos)
+    first, last = float(signal[0]), float(signal[-1])
+    left = 2.0 * first - np.asarray(signal[padlen:0:-1], dtype=np.float64)
+    right = 2.0 * last - np.asarray(signal[-2:-(padlen + 2):-1], dtype=np.float64)
+
+    out = np.empty(n, dtype=np.float64)
+    _, zi = sosfilt(sos, left, zi=zi_unit * left[0])
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        out[start:stop], zi = sosfilt(sos, np.asarray(signal[start:stop], dtype=np.float64), zi=zi)
+    tail, _ = sosfilt(sos, right, zi=zi)
+
+    _, zi = sosfilt(sos, tail[::-1], zi=zi_unit * tail[-1])
+    for stop in range(n, 0, -chunk_size):
+        start = max(stop - chunk_size, 0)
+        backward, zi = sosfilt(sos, out[start:stop][::-1], zi=zi)
+        out[start:stop] = backward[::-1]
+    return out
+
+
+def bandpass_filter(signal, lowcut, highcut, fs, order=3, chunk_size=FILTER_CHUNK):
+    sos = bandpass_sos(lowcut, highcut, float(fs), order)
+    if len(signal) <= chunk_size:
+        return sosfiltfilt(sos, signal)
+    return sosfiltfilt_chunked(sos, signal, chunk_size)
 
-filtered_ppg = bandpass_filter(ppg_signal, LOWCUT, HIGHCUT, SAMPLING_RATE)
 
 # 🔹 2. Detect Peaks (Heartbeats)
-peaks, _ = find_peaks(filtered_ppg, distance=SAMPLING_RATE//2, prominence=0.3)
+def detect_heartbeats(filtered_ppg, fs):
+    peaks, _ = find_peaks(filtered_ppg, distance=max(int(fs // 2), 1), prominence=PEAK_PROMINENCE)
+    return peaks
 
-# 🔹 3. Compute Heart Rate (BPM)
-peak_times = time[peaks]
-peak_intervals = np.diff(peak_times)  # Time difference between beats
 
-if len(peak_intervals) > 0:
+def detect_clean_heartbeats(ppg, filtered_ppg, fs):
+    """detect_heartbeats on the windows that pass the signal-quality index (ppg_quality.py).
+
+    Returns (peak indices, per-interval valid mask, per-window SQI table).
+    """
+    quality = signal_quality(ppg, filtered_ppg, fs)
+    return gated_peaks(filtered_ppg, fs, quality, detect_heartbeats)
+
+
+# 🔹 3. Compute Heart Rate (BPM)
+def heart_rate(peak_times):
+    peak_intervals = np.diff(peak_times)  # Time difference between beats
+    if len(peak_intervals) == 0:
+        return None
     avg_beat_interval = np.mean(peak_intervals)  # Average interval between peaks
-    heart_rate = 60 / avg_beat_interval  # Convert to BPM
-    print(f"\n❤️ Estimated Heart Rate: {heart_rate:.2f} BPM")
-else:
-    print("\n⚠️ Not enough data to calculate heart rate.")
-
-# 🔹 4. Plot PPG Signal & Detected Heartbeats
-plt.figure(figsize=(10, 5))
-plt.plot(time, filtered_ppg, label="Filtered PPG Signal", color="blue")
-plt.plot(time[peaks], filtered_ppg[peaks], "ro", label="Detected Heartbeats")  # Mark peaks
-plt.axvline(x=60, color="g", linestyle="--", label="Walking Begins")  # Walking starts at 60s
-plt.xlabel("Time (s)")
-plt.ylabel("PPG Value (mV)")
-plt.title("PPG Signal with Heart Rate Detection")
-plt.legend()
-plt.grid()
-plt.show()
+    return 60 / avg_beat_interval  # Convert to BPM
+
+
+def file_identity(path):
+    """(experiment, participant) from data/{experiment}/participant_{id}_ppg_*."""
+    match = FILE_PATTERN.search(os.path.basename(path))
+    participant = match.group("participant") if match else os.path.basename(path)
+    experiment = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return experiment, participant
+
+
+def recording_row(path, time, fs):
+    """Identity and length columns of a recording's summary row."""
+    experiment, participant = file_identity(path)
+    return {
+        "experiment": experiment,
+        "participant": participant,
+        "file": path,
+        "fs": fs,
+        "duration_s": float(time[-1]) if len(time) else 0.0,
+    }
+
+
+def analyze_file(path):
+    """Filter, detect beats and summarise one recording into a flat dict (one table row)."""
+    time, ppg, fs = load_ppg(path)
+    row = recording_row(path, time, fs)
+    if len(ppg) <= 3 * (2 * FILTER_ORDER + 1):
+        return dict(row, beats=0, hr_bpm=None, quality=0.0)
+
+    filtered_ppg = bandpass_filter(ppg, LOWCUT, HIGHCUT, fs, FILTER_ORDER)
+    peaks, valid, quality = detect_clean_heartbeats(ppg, filtered_ppg, fs)
+    from epochs import phase_bounds
+
+    return summarise_beats(row, time[peaks], valid, quality["passed"].mean(), phase_bounds(path, time))
+
+
+def summarise_beats(row, peak_times, valid=None, sqi_pass=None, phases=None):
+    """Add beat count, HR, quality and HRV columns for ``peak_times`` to a summary row.
+
+    ``valid`` marks the intervals between beats that may be used (see
+    detect_clean_heartbeats); implausible intervals are always left out of HR and HRV.
+    ``phases`` maps phase names to measured (start, stop) seconds (epochs.phase_bounds);
+    the columns of the PHASES missing from it are left empty.
+    """
+    row = dict(row)
+    intervals = np.diff(peak_times)
+    plausible = (intervals >= MIN_IBI) & (intervals <= MAX_IBI)
+    valid = plausible if valid is None else plausible & valid
+    row["beats"] = len(peak_times)
+    row["hr_bpm"] = 60.0 / float(np.mean(intervals[valid])) if valid.any() else None
+    row["quality"] = float(np.mean(plausible)) if len(intervals) else 0.0
+    row["sqi_pass"] = None if sqi_pass is None else float(sqi_pass)
+
+    # 🔹 HRV: medians over sliding windows, plus every measured phase as one window
+    windows = sliding_hrv(peak_times, HRV_WINDOW, HRV_STEP, valid=valid)
+    for metric in ("sdnn_ms", "rmssd_ms", "pnn50", "lf_hf"):
+        row[metric] = float(windows[metric].median()) if windows[metric].notna().any() else None
+    for phase in PHASES:
+        row[f"start_{phase}"] = row[f"end_{phase}"] = row[f"beats_{phase}"] = None
+        row[f"hr_{phase}"] = row[f"sdnn_{phase}"] = row[f"rmssd_{phase}"] = None
+    measured = [phase for phase in PHASES if phases and phase in phases]
+    if not measured:
+        return row
+    starts = np.array([phases[phase][0] for phase in measured], dtype=np.float64)
+    stops = np.array([phases[phase][1] for phase in measured], dtype=np.float64)
+    ibi_times, ibis, successive = beat_intervals(peak_times, valid)
+    phase_stats = window_stats(ibi_times, ibis, starts, stops, successive)
+    beats = np.searchsorted(peak_times, stops) - np.searchsorted(peak_times, starts)
+    for i, phase in enumerate(measured):
+        row[f"start_{phase}"], row[f"end_{phase}"] = float(starts[i]), float(stops[i])
+        row[f"beats_{phase}"] = int(beats[i])
+        for metric in ("hr_bpm", "sdnn_ms", "rmssd_ms"):
+            value = phase_stats[metric][i]
+            row[f"{metric.split('_')[0]}_{phase}"] = None if np.isnan(value) else float(value)
+    return row
+
+
+# 🔹 Batch mode: every participant, process pool, per-file cache
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(path, params, cache_dir=CACHE_DIR):
+    params_hash = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{file_hash(path)}_{params_hash}.json")
+
+
+def analyze_file_cached(path, cache_dir=CACHE_DIR):
+    """analyze_file, reusing the stored result while the file content and parameters are unchanged.
+
+    The phase bounds come from the marker log and the Stroop files, so their
+    signatures are part of the key as well.
+    """
+    from epochs import phase_signature
+
+    params = dict(analysis_params(), phase_sources=phase_signature(path))
+    cached = cache_path(path, params, cache_dir)
+    if os.path.exists(cached):
+        with open(cached) as f:
+            row = json.load(f)
+        # The cache is keyed by content, so identity always comes from the path.
+        row["experiment"], row["participant"] = file_identity(path)
+        row["file"] = path
+        return row
+    row = analyze_file(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cached + f".{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(row, f)
+    os.replace(tmp, cached)
+    return row
+
+
+def discover(root=DATA_ROOT):
+    """Every data/{experiment}/participant_*_ppg_data.csv or _ppg_session.bin under root."""
+    paths = glob.glob(os.path.join(root, "*", "participant_*_ppg_data.csv"))
+    paths += glob.glob(os.path.join(root, "*", "participant_*_ppg_session.bin"))
+    return sorted(paths)
+
+
+def batch(root=DATA_ROOT, out=None, workers=None, cache_dir=None):
+    """Summarise every recording under ``root``; the table and the cache default to inside ``root``."""
+    out = out or os.path.join(root, SUMMARY_NAME)
+    cache_dir = cache_dir or os.path.join(root, CACHE_DIRNAME)
+    paths = discover(root)
+    if not paths:
+        print(f"⚠️ No PPG recordings found under {root}.")
+        return pd.DataFrame()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(analyze_file_cached, paths, [cache_dir] * len(paths)))
+    summary = pd.DataFrame(rows).sort_values(["experiment", "participant"])
+    summary.to_csv(out, index=False)
+    print(f"✅ {len(summary)} recordings summarised in {out}")
+    return summary
+
+
+# 🔹 4. Plot PPG Signal & Detected Heartbeats (decimated, see ppg_plot.py)
+def plot_file(path):
+    from ppg_plot import show_recording
+
+    show_recording(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PPG heart-rate analysis.")
+    parser.add_argument("file", nargs="?", default=DEFAULT_FILE, help="recording to plot")
+    parser.add_argument("--batch", action="store_true", help="summarise every participant under --root")
+    parser.add_argument("--root", default=DATA_ROOT)
+    parser.add_argument("--out", default=None, help=f"summary table (default: --root/{SUMMARY_NAME})")
+    parser.add_argument("--cache-dir", default=None, help=f"per-file result cache (default: --root/{CACHE_DIRNAME})")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.batch:
+        batch(args.root, args.out, args.workers, args.cache_dir)
+    else:
+        plot_file(args.file)
@@ -19,7 +19,7 @@ an intensity value (0-100).
 """
 
 from time import sleep
-from haptics_motor_control import activate_discrete, player
+from haptics_motor_control import activate_discrete_frame, player
 
 # Wave Pattern (5 time steps)
 # Each step shows the wave moving from top to bottom
@@ -193,21 +193,16 @@ def activate_motor_array(pattern_step: dict, duration_ms: int):
             - Values represent motor intensities (0-100)
         duration_ms (int): Duration for each motor activation in milliseconds
     """
-    # Process front panel
-    for row in range(5):
-        for col in range(4):
-            motor_idx = row * 4 + col
-            intensity = pattern_step["front"][row][col]
-            if intensity > 0:
-                activate_discrete('front', motor_idx, intensity, duration_ms)
-    
-    # Process back panel
-    for row in range(5):
-        for col in range(4):
-            motor_idx = row * 4 + col
-            intensity = pattern_step["back"][row][col]
-            if intensity > 0:
-                activate_discrete('back', motor_idx, intensity, duration_ms)
+    # Collect the active motors of both panels and send them as one message
+    panels = {}
+    for panel in ("front", "back"):
+        panels[panel] = [
+            (row * 4 + col, pattern_step[panel][row][col])
+            for row in range(5)
+            for col in range(4)
+            if pattern_step[panel][row][col] > 0
+        ]
+    activate_discrete_frame(panels, duration_ms)
     
     # Wait for this step to complete before moving to next
     sleep(duration_ms / 1000.0 + 0.1)
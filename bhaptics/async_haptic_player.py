@@ -0,0 +1,325 @@
+"""
+asyncio client for the bHaptics Player websocket.
+
+The client is event-driven: one task reads status frames as they arrive and
+one writer task sends queued messages in order, so an idle connection costs no
+CPU. When the Player is not running or the connection drops, the client
+reconnects with exponential backoff (MIN_BACKOFF doubling up to MAX_BACKOFF).
+Registrations belong to a connection, so every registered project is sent
+again right after a reconnect. Messages submitted while disconnected are
+dropped (and counted), as a late haptic cue is worse than a missing one.
+
+Status frames ({"ActiveKeys": [...], "ConnectedPositions": [...]}) update
+``active_keys`` and ``connected_positions``; frames that do not parse are
+counted in ``status_errors`` instead of being printed.
+
+Pattern completion: submitting a registered key marks it pending, the status
+frame that lists it marks it playing, and the first frame without it (or a lost
+connection) finishes it. The per-key state sits behind a threading.Condition,
+so wait_until_finished(key, timeout) returns within one status frame of the
+end of a pattern, from any thread but the loop's own; wait_finished is the
+asyncio variant. Completion callbacks run on the event loop. A key the Player
+does not report as active within START_TIMEOUT (unknown key, no connection)
+counts as finished right away.
+
+better_haptic_player is a sync facade over one AsyncHapticPlayer running on a
+background event loop thread. Code that already has an event loop (a trigger
+server, the orchestrator) can use the client directly:
+
+    player = AsyncHapticPlayer()
+    await player.start()
+    await player.wait_connected(timeout=2)
+    await player.submit_registered("inhale")
+
+and better_haptic_player.attach(player) makes the sync functions share it.
+"""
+
+import asyncio
+import json
+import threading
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+from bhaptics import payloads
+
+PLAYER_URL = "ws://localhost:15881/v2/feedbacks"
+MIN_BACKOFF = 0.5  # s
+MAX_BACKOFF = 10.0  # s
+OPEN_TIMEOUT = 5.0  # s
+START_TIMEOUT = 1.0  # s a submitted key may take to show up in ActiveKeys
+
+
+class AsyncHapticPlayer:
+    def __init__(self, url=PLAYER_URL, min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF):
+        self.url = url
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.active_keys = set()
+        self.connected_positions = set()
+        # key -> (content hash, Register payload), replayed after every reconnect
+        self.registrations = {}
+        self.status_errors = 0
+        # key -> "pending" | "playing"; keys without an entry are finished
+        self._playback = {}
+        self._pending = {}  # key -> token of the latest expect(), for START_TIMEOUT
+        self._condition = threading.Condition()
+        self._waiters = {}  # key -> futures of wait_finished calls
+        self._key_callbacks = {}  # key -> one-shot on_finished callbacks
+        self._finished_callbacks = []
+        self.dropped = 0
+        self.loop = None
+        self._ws = None
+        self._queue = None
+        self._connected = None
+        self._task = None
+        self._closing = False
+
+    # 🔹 Connection
+    @property
+    def connected(self):
+        return self._ws is not None
+
+    async def start(self):
+        """Start connecting in the background; returns immediately."""
+        if self._task is None:
+            self.loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            self._connected = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def wait_connected(self, timeout=None):
+        """True once connected, False if ``timeout`` seconds pass first."""
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        self._closing = True
+        if self._ws is not None:
+            await self._ws.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        backoff = self.min_backoff
+        reported = False
+        while not self._closing:
+            try:
+                # Status frames are tiny and the Player does not need keepalive pings;
+                # asyncio already sets TCP_NODELAY on the socket.
+                async with connect(self.url, ping_interval=None, compression=None,
+                                   open_timeout=OPEN_TIMEOUT) as ws:
+                    backoff = self.min_backoff
+                    reported = False
+                    await self._serve(ws)
+            except (OSError, asyncio.TimeoutError, WebSocketException) as error:
+                if not reported:
+                    print(f"Couldn't connect to the bHaptics Player ({error}); retrying in the background")
+                    reported = True
+            if self._closing:
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _serve(self, ws):
+        writer = asyncio.create_task(self._write(ws))
+        for _, payload in list(self.registrations.values()):
+            self._queue.put_nowait((payload, None))
+        self._ws = ws
+        self._connected.set()
+        try:
+            async for message in ws:
+                self._on_status(message)
+        finally:
+            self._ws = None
+            self._connected.clear()
+            self._set_active(set())
+            writer.cancel()
+            self._drop_queued()
+
+    async def _write(self, ws):
+        while True:
+            payload, done = await self._queue.get()
+            try:
+                # Payloads are UTF-8 bytes; the Player expects text frames.
+                await ws.send(payload, text=True)
+            except WebSocketException:
+                # The connection is gone; the reader notices and drops the rest.
+                if done is not None and not done.done():
+                    done.set_result(False)
+                return
+            if done is not None and not done.done():
+                done.set_result(True)
+
+    def _drop_queued(self):
+        while not self._queue.empty():
+            _, done = self._queue.get_nowait()
+            self.dropped += 1
+            if done is not None and not done.done():
+                done.set_result(False)
+
+    def _on_status(self, message):
+        try:
+            status = json.loads(message)
+            active = status["ActiveKeys"]
+            positions = status["ConnectedPositions"]
+        except (ValueError, TypeError, KeyError):
+            self.status_errors += 1
+            return
+        self.connected_positions = set(positions)
+        self._set_active(set(active))
+
+    # 🔹 Playback state
+    def _set_active(self, active):
+        with self._condition:
+            previous, self.active_keys = self.active_keys, active
+            for key in active - previous:
+                self._playback[key] = "playing"
+                self._pending.pop(key, None)
+            finished = [key for key in previous - active if self._playback.pop(key, None) is not None]
+            if finished or active != previous:
+                self._condition.notify_all()
+        for key in finished:
+            self._on_finished(key)
+
+    def expect(self, key):
+        """Mark ``key`` as submitted, so waiters block until the Player has played it."""
+        with self._condition:
+            if self._playback.get(key) == "playing":
+                return
+            self._playback[key] = "pending"
+            token = self._pending[key] = object()
+        self.loop.call_soon_threadsafe(self.loop.call_later, START_TIMEOUT, self._expire, key, token)
+
+    def _expire(self, key, token):
+        with self._condition:
+            if self._playback.get(key) != "pending" or self._pending.get(key) is not token:
+                return
+            del self._playback[key], self._pending[key]
+            self._condition.notify_all()
+        self._on_finished(key)
+
+    def _on_finished(self, key):
+        # Runs on the event loop.
+        for future in self._waiters.pop(key, []):
+            if not future.done():
+                future.set_result(True)
+        for callback in self._key_callbacks.pop(key, []) + self._finished_callbacks:
+            try:
+                callback(key)
+            except Exception as error:
+                print(f"Error in haptic completion callback for '{key}': {error}")
+
+    def is_finished(self, key):
+        with self._condition:
+            return key not in self._playback
+
+    def wait_until_finished(self, key, timeout=None):
+        """Block until ``key`` has finished playing; False if ``timeout`` seconds pass first.
+
+        Must not be called on the client's event loop thread (use wait_finished there).
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: key not in self._playback, timeout)
+
+    async def wait_finished(self, key, timeout=None):
+        """asyncio variant of wait_until_finished."""
+        if self.is_finished(key):
+            return True
+        future = self.loop.create_future()
+        self._waiters.setdefault(key, []).append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if future in self._waiters.get(key, []):
+                self._waiters[key].remove(future)
+
+    def on_finished(self, key, callback):
+        """Call ``callback(key)`` once, on the event loop, when ``key`` has finished playing."""
+        def register():
+            if self.is_finished(key):
+                callback(key)
+            else:
+                self._key_callbacks.setdefault(key, []).append(callback)
+        self.loop.call_soon_threadsafe(register)
+
+    def add_finished_callback(self, callback):
+        """Call ``callback(key)``, on the event loop, every time any key finishes playing."""
+        self._finished_callbacks.append(callback)
+
+    # 🔹 Sending
+    def _enqueue(self, payload, done=None):
+        if self._ws is None:
+            self.dropped += 1
+            if done is not None:
+                done.set_result(False)
+            return
+        self._queue.put_nowait((payload, done))
+
+    async def send(self, payload):
+        """Send one message; True once written, False if there was no connection."""
+        done = self.loop.create_future()
+        self._enqueue(payload, done)
+        return await done
+
+    def send_threadsafe(self, payload):
+        """Queue one message from any thread without waiting for it."""
+        self.loop.call_soon_threadsafe(self._enqueue, payload)
+
+    def remember_registration(self, key, digest, payload):
+        self.registrations[key] = (digest, payload)
+
+    def is_registered(self, key, digest=None):
+        """True if ``key`` is registered (with content hash ``digest``, if given)."""
+        registration = self.registrations.get(key)
+        return registration is not None and (digest is None or registration[0] == digest)
+
+    # 🔹 Player API
+    async def register_project(self, key, project, digest=None):
+        payload = payloads.register_payload(key, project)
+        self.remember_registration(key, digest, payload)
+        return await self.send(payload)
+
+    async def submit_registered(self, key, alt_key=None, scale_option=None, rotation_option=None):
+        self.expect(key)
+        return await self.send(payloads.key_payload(key, alt_key, scale_option, rotation_option))
+
+    async def submit(self, key, frame):
+        return await self.send(payloads.submit_message([payloads.frame_submission(key, frame)]))
+
+    async def submit_dot(self, key, position, dot_points, duration_millis):
+        submission = payloads.dot_submission(key, position, dot_points, duration_millis)
+        return await self.send(payloads.submit_message([submission]))
+
+    async def submit_path(self, key, position, path_points, duration_millis):
+        submission = payloads.path_submission(key, position, path_points, duration_millis)
+        return await self.send(payloads.submit_message([submission]))
+
+    async def submit_batch(self, batch):
+        """Send a payloads.FrameBatch as one message."""
+        message = batch.take()
+        return await self.send(message) if message is not None else True
+
+    async def stop_pattern(self, key):
+        return await self.send(payloads.stop_payload(key))
+
+    def is_playing(self):
+        return len(self.active_keys) > 0
+
+    def is_playing_key(self, key):
+        return key in self.active_keys
+
+    def is_device_connected(self, position):
+        return position in self.connected_positions
@@ -1,14 +1,20 @@
+import asyncio
 import json
-import socket
-from websocket import create_connection, WebSocket
 import threading
 import time
 from enum import Enum
 
-ws = None
+from bhaptics import payloads
+from bhaptics.async_haptic_player import AsyncHapticPlayer
+from bhaptics.payloads import clear_payload_cache, payload_cache_info, project_digest  # noqa: F401
 
-active_keys = set([])
-connected_positions = set([])
+# The sync API below is a facade over one AsyncHapticPlayer. initialize() runs it
+# on its own event loop thread; attach() shares a client an asyncio program
+# already runs.
+CONNECT_TIMEOUT = 2.0  # s initialize() waits for the first connection
+
+_client = None
+_own_loop = None
 
 class BhapticsPosition(Enum):
     Vest = "Vest"
@@ -24,101 +30,105 @@ class BhapticsPosition(Enum):
     GloveL = "GloveL"
     GloveR = "GloveR"
 
-class WebSocketReceiver(WebSocket):
-    def recv_frame(self):
-        global active_keys
-        global connected_positions
-        frame = super().recv_frame()
-        try:
-            frame_obj = json.loads(frame.data)
-            active = frame_obj['ActiveKeys']
 
-            # if len(active) > 0:
-            #     print (active)
-            active_keys = set(active)
-            connected_positions = set(frame_obj['ConnectedPositions'])
-        except:
-            # active_keys = set([])
-            # connected_positions = set([])
-            print('')
+def _call(coroutine, timeout=None):
+    """Run a client coroutine on the client's loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _client.loop).result(timeout)
+
 
-        return frame
+def initialize():
+    global _client, _own_loop
+    if _client is None:
+        _own_loop = asyncio.new_event_loop()
+        threading.Thread(target=_own_loop.run_forever, name="bhaptics", daemon=True).start()
+        _client = AsyncHapticPlayer()
+        asyncio.run_coroutine_threadsafe(_client.start(), _own_loop).result()
+    if not _call(_client.wait_connected(CONNECT_TIMEOUT)):
+        # The client keeps reconnecting in the background.
+        print("Couldn't connect")
 
 
-def thread_function(name):
-    while True:
-        if ws is not None:
-            ws.recv_frame()
+def attach(client):
+    """Make the sync API use an already started AsyncHapticPlayer (and its event loop)."""
+    global _client
+    _client = client
 
 
-def initialize():
-    global ws
-    try:
-        ws = create_connection("ws://localhost:15881/v2/feedbacks",
-                               sockopt=((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),),
-                               class_=WebSocketReceiver)
-
-        x = threading.Thread(target=thread_function, args=(1,), daemon=True)
-        x.start()
-    except:
-        print("Couldn't connect")
+def destroy():
+    global _client, _own_loop
+    if _client is None:
         return
+    if _client.loop.is_running():
+        _call(_client.close())
+    if _own_loop is not None:
+        _own_loop.call_soon_threadsafe(_own_loop.stop)
+        _own_loop = None
+    _client = None
 
 
-def destroy():
-    if ws is not None:
-        ws.close()
+def wait_until_finished(key, timeout=None):
+    """Block until the pattern submitted under ``key`` has finished playing.
+
+    Returns False if it is still playing after ``timeout`` seconds. A key the
+    Player never reports as playing counts as finished after a short grace
+    period (async_haptic_player.START_TIMEOUT).
+    """
+    return _client is None or _client.wait_until_finished(key, timeout)
+
+
+def on_finished(key, callback):
+    """Call ``callback(key)`` once when ``key`` has finished playing (on the client's loop thread)."""
+    if _client is not None:
+        _client.on_finished(key, callback)
+
+
+def add_finished_callback(callback):
+    """Call ``callback(key)`` whenever any key finishes playing (on the client's loop thread)."""
+    if _client is not None:
+        _client.add_finished_callback(callback)
 
 
 def is_playing():
-    return len(active_keys) > 0
+    return _client is not None and _client.is_playing()
 
 
 def is_playing_key(key):
-    return key in active_keys
+    return _client is not None and _client.is_playing_key(key)
 
 
 # position Vest Head ForeamrL ForearmR HandL HandR FootL FootR
 def is_device_connected(position):
-    return position in connected_positions
+    return _client is not None and _client.is_device_connected(position)
 
 
 def register(key, file_directory):
-    json_data = open(file_directory).read()
+    with open(file_directory, "rb") as f:
+        json_data = f.read()
 
-    print(json_data)
+    project = json.loads(json_data)["project"]
+    register_project(key, project, project_digest(json_data))
 
-    data = json.loads(json_data)
-    project = data["project"]
 
-    layout = project["layout"]
-    tracks = project["tracks"]
+def register_project(key, project, digest=None):
+    """Register a parsed .tact project under ``key`` and remember its content hash.
 
-    request = {
-        "Register": [{
-            "Key": key,
-            "Project": {
-                "Tracks": tracks,
-                "Layout": layout
-            }
-        }]
-    }
-
-    json_str = json.dumps(request)
-    __submit(json_str)
+    The client re-registers it by itself after a reconnect.
+    """
+    if _client is None:
+        return
+    payload = payloads.register_payload(key, project)
+    _client.remember_registration(key, digest, payload)
+    __submit(payload)
 
 
-def submit_registered(key):
-    request = {
-        "Submit": [{
-            "Type": "key",
-            "Key": key,
-        }]
-    }
+def is_registered(key, digest=None):
+    """True if the player holds ``key`` (with content hash ``digest``, if given)."""
+    return _client is not None and _client.is_registered(key, digest)
 
-    json_str = json.dumps(request)
 
-    __submit(json_str)
+def submit_registered(key):
+    _expect(key)
+    __submit(payloads.key_payload(key))
 
 
 def submit_registered_with_option(
@@ -127,81 +137,90 @@ def submit_registered_with_option(
         rotation_option):
     # scaleOption: {"intensity": 1, "duration": 1}
     # rotationOption: {"offsetAngleX": 90, "offsetY": 0}
-    request = {
-        "Submit": [{
-            "Type": "key",
-            "Key": key,
-            "Parameters": {
-                "altKey": alt_key,
-                "rotationOption": rotation_option,
-                "scaleOption": scale_option,
-            }
-        }]
-    }
+    _expect(key)
+    __submit(payloads.key_payload(key, alt_key, scale_option, rotation_option))
 
-    json_str = json.dumps(request);
 
-    __submit(json_str)
+def submit(key, frame):
+    __submit(payloads.submit_message([payloads.frame_submission(key, frame)]))
 
 
-def submit(key, frame):
-    request = {
-        "Submit": [{
-            "Type": "frame",
-            "Key": key,
-            "Frame": frame
-        }]
-    }
+def submit_dot(key, position, dot_points, duration_millis):
+    __submit(payloads.submit_message([payloads.dot_submission(key, position, dot_points, duration_millis)]))
 
-    json_str = json.dumps(request);
 
-    __submit(json_str)
+def submit_path(key, position, path_points, duration_millis):
+    __submit(payloads.submit_message([payloads.path_submission(key, position, path_points, duration_millis)]))
 
 
-def submit_dot(key, position, dot_points, duration_millis):
-    front_frame = {
-        "position": position,
-        "dotPoints": dot_points,
-        "durationMillis": duration_millis
-    }
-    submit(key, front_frame)
+def submit_frames(frames):
+    """Submit several (key, frame) pairs in one websocket message."""
+    __submit(payloads.submit_message([payloads.frame_submission(key, frame) for key, frame in frames]))
 
-def submit_path(key, position, path_points, duration_millis):
-    front_frame = {
-        "position": position,
-        "pathPoints": path_points,
-        "durationMillis": duration_millis
-    }
-    submit(key, front_frame)
 
-def __submit(json_str):
-    if ws is not None:
-        ws.send(json_str)
+class FrameBatch(payloads.FrameBatch):
+    """Dot/path frames collected into a single Submit message.
+
+    Used as a context manager, the batch is sent when the block exits without
+    an error:
+
+        with FrameBatch() as batch:
+            batch.add_dot("frontFrame", "VestFront", front_dots, 100)
+            batch.add_dot("backFrame", "VestBack", back_dots, 100)
+    """
+
+    def send(self):
+        """Send the collected frames (if any) as one message and empty the batch."""
+        message = self.take()
+        if message is not None:
+            _send(message)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.send()
+
+
+def _expect(key):
+    # Track the key's playback so wait_until_finished/on_finished see this submit.
+    if _client is not None and _client.loop is not None:
+        _client.expect(key)
+
+
+def _send(payload):
+    __submit(payload)
+
+
+def __submit(payload):
+    # Queued on the client's event loop; dropped while there is no connection.
+    if _client is not None:
+        _client.send_threadsafe(payload)
 
 def stop_pattern(key):
     """
     Stop playing a haptic pattern associated with the given key.
     """
-    request = {
-        "Stop": [{
-            "Key": key
-        }]
-    }
-    json_str = json.dumps(request)
-    __submit(json_str)
+    __submit(payloads.stop_payload(key))
 
 def stop_all_patterns():
     """
     Stop all currently playing haptic patterns.
     """
-    for key in list(active_keys):
-        stop_pattern(key)
-    
+    if _client is not None:
+        for key in list(_client.active_keys):
+            stop_pattern(key)
+
     time.sleep(1)
-    
+
     # Close the websocket connection.
     destroy()
-    
+
 def is_initialized():
-    return ws is not None and ws.connected
+    return _client is not None and _client.connected
+
 
+def is_started():
+    """True once initialize() or attach() has set up a client, connected or still reconnecting."""
+    return _client is not None
@@ -0,0 +1,156 @@
+"""
+Serialized bHaptics Player messages, shared by the sync and asyncio players.
+
+Every message is built as UTF-8 bytes. Submit payloads are cached per distinct
+(key, options) or dot/path frame, so repeated submits send prebuilt bytes.
+Options and points are turned into tuples of dict items to act as cache keys,
+which is much cheaper than a json.dumps. A Submit message is a list of
+submissions, so several frames can share one message (FrameBatch).
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+
+PAYLOAD_CACHE_SIZE = 1024  # serialized messages kept per message type
+# '{"Submit": [' + ', '.join(submissions) + ']}'
+_SUBMIT_PREFIX = b'{"Submit": ['
+_SUBMIT_SUFFIX = b']}'
+
+
+def project_digest(json_data):
+    """Content hash of a .tact file, used to tell whether a key needs re-registering."""
+    if isinstance(json_data, str):
+        json_data = json_data.encode("utf-8")
+    return hashlib.sha1(json_data).hexdigest()
+
+
+def register_payload(key, project):
+    layout = project["layout"]
+    tracks = project["tracks"]
+
+    request = {
+        "Register": [{
+            "Key": key,
+            "Project": {
+                "Tracks": tracks,
+                "Layout": layout
+            }
+        }]
+    }
+    return json.dumps(request).encode("utf-8")
+
+
+@lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def _key_payload(key, alt_key=None, scale_option=None, rotation_option=None):
+    submission = {
+        "Type": "key",
+        "Key": key,
+    }
+    if alt_key is not None or scale_option is not None or rotation_option is not None:
+        submission["Parameters"] = {
+            "altKey": alt_key,
+            "rotationOption": dict(rotation_option) if rotation_option is not None else None,
+            "scaleOption": dict(scale_option) if scale_option is not None else None,
+        }
+    return json.dumps({"Submit": [submission]}).encode("utf-8")
+
+
+def _items(option):
+    return tuple(option.items()) if option is not None else None
+
+
+def key_payload(key, alt_key=None, scale_option=None, rotation_option=None):
+    # scaleOption: {"intensity": 1, "duration": 1}
+    # rotationOption: {"offsetAngleX": 90, "offsetY": 0}
+    return _key_payload(key, alt_key, _items(scale_option), _items(rotation_option))
+
+
+@lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def stop_payload(key):
+    return json.dumps({"Stop": [{"Key": key}]}).encode("utf-8")
+
+
+@lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def _points_submission(key, position, points_field, points, duration_millis):
+    frame = {
+        "position": position,
+        points_field: [dict(point) for point in points],
+        "durationMillis": duration_millis
+    }
+    return frame_submission(key, frame)
+
+
+@lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def _frame_prefix(key):
+    # Everything of a frame submission up to the frame itself.
+    return json.dumps({"Type": "frame", "Key": key, "Frame": None}).encode("utf-8")[:-len(b"null}")]
+
+
+def frame_submission(key, frame):
+    # Arbitrary frames are not cached, only the envelope around them is.
+    return _frame_prefix(key) + json.dumps(frame).encode("utf-8") + b"}"
+
+
+def dot_submission(key, position, dot_points, duration_millis):
+    points = tuple(tuple(point.items()) for point in dot_points)
+    return _points_submission(key, position, "dotPoints", points, duration_millis)
+
+
+def path_submission(key, position, path_points, duration_millis):
+    points = tuple(tuple(point.items()) for point in path_points)
+    return _points_submission(key, position, "pathPoints", points, duration_millis)
+
+
+def submit_message(submissions):
+    """One Submit message carrying all ``submissions``."""
+    return _SUBMIT_PREFIX + b", ".join(submissions) + _SUBMIT_SUFFIX
+
+
+def payload_cache_info():
+    """Hits, misses, cached payloads and hit rate of the Submit payload caches."""
+    infos = [_key_payload.cache_info(), _points_submission.cache_info()]
+    hits = sum(info.hits for info in infos)
+    misses = sum(info.misses for info in infos)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "size": sum(info.currsize for info in infos),
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+def clear_payload_cache():
+    for cache in (_key_payload, _points_submission, _frame_prefix, stop_payload):
+        cache.cache_clear()
+
+
+class FrameBatch:
+    """Dot/path frames collected into a single Submit message.
+
+    Frames with different keys play at the same time, e.g. one dot frame for
+    VestFront and one for VestBack. The players send a batch with
+    better_haptic_player.FrameBatch (a context manager) or
+    AsyncHapticPlayer.submit_batch.
+    """
+
+    def __init__(self):
+        self.submissions = []
+
+    def __len__(self):
+        return len(self.submissions)
+
+    def add(self, key, frame):
+        self.submissions.append(frame_submission(key, frame))
+
+    def add_dot(self, key, position, dot_points, duration_millis):
+        self.submissions.append(dot_submission(key, position, dot_points, duration_millis))
+
+    def add_path(self, key, position, path_points, duration_millis):
+        self.submissions.append(path_submission(key, position, path_points, duration_millis))
+
+    def take(self):
+        """The batch as one message (None if empty); the batch is emptied."""
+        message = submit_message(self.submissions) if self.submissions else None
+        self.submissions = []
+        return message
@@ -0,0 +1,236 @@
+"""
+Event-locked epochs of PPG heart rate / HRV around experiment markers.
+
+audio.py logs one row per event to ``data/{experiment}/participant_{id}_data.csv``
+("YYYY-mm-dd HH:MM:SS", event), e.g. "Cycle 1: Signal sent: inhale",
+"Audio: bodyScan" or "Audio: left_chest". Every marker opens an epoch that runs
+until the next marker (or the end of the recording). Marker wall-clock times are
+mapped onto the PPG time axis with ``searchsorted`` and the HR/HRV of all epochs
+of a participant is computed in one hrv.window_stats call.
+
+The PPG wall-clock axis comes from the session header's clock base for binary
+sessions. CSV recordings carry only device ticks, so their start is estimated as
+the file's modification time minus the recording length (ppg.py writes the CSV
+line-buffered, so the last write is the last sample). Markers have 1 s
+resolution either way.
+
+The same clocks give every session its measured phases (phase_bounds): the
+Stroop runs from their result files, meditation from the first to the last
+marker and the break in between.
+
+Usage:
+    $ python epochs.py                          # every participant under ./data
+    $ python epochs.py --root ./data --out ./data/ppg_epochs.csv
+"""
+
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analyze_ppg import (
+    DATA_ROOT, FILTER_ORDER, HIGHCUT, LOWCUT, MAX_IBI, MIN_IBI, PHASES, bandpass_filter,
+    detect_clean_heartbeats, discover, file_identity, load_ppg,
+)
+from hrv import beat_intervals, window_stats
+from ppg_session import SessionReader
+
+EPOCHS_FILE = "./data/ppg_epochs.csv"
+EPOCH_TYPES_FILE = "./data/ppg_epoch_types.csv"
+MARKER_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # audio.log_event
+MARKER_RESOLUTION = 1.0  # s
+STROOP_TRIAL_SECONDS = 1.0  # stroop.ISI; stroop.py writes one result row per trial
+
+# "Cycle 2: Signal sent: inhale" -> cycle 2, kind "signal sent", label "inhale"
+EVENT_PATTERN = re.compile(r"^(?:Cycle (?P<cycle>\d+): )?(?:(?P<kind>[^:]+): )?(?P<label>.*)$")
+
+
+def marker_path(ppg_path):
+    """participant_{id}_data.csv next to a participant_{id}_ppg_* recording."""
+    experiment, participant = file_identity(ppg_path)
+    return os.path.join(os.path.dirname(ppg_path), f"participant_{participant}_data.csv")
+
+
+def load_markers(path):
+    """Marker log as a DataFrame: wall (Unix seconds), event, kind, label, cycle."""
+    markers = pd.read_csv(path, header=None, names=["timestamp", "event"], dtype=str,
+                          keep_default_na=False, engine="c")
+    # The log is in local time; mktime applies the same DST rules as audio.py did.
+    stamps = {s: time.mktime(time.strptime(s, MARKER_TIME_FORMAT)) for s in markers["timestamp"].unique()}
+    markers["wall"] = markers["timestamp"].map(stamps).astype(np.float64)
+    parts = markers["event"].str.strip().str.extract(EVENT_PATTERN)
+    markers["kind"] = parts["kind"].fillna("").str.lower()
+    markers["label"] = parts["label"].str.replace(r"\.wav$", "", regex=True)
+    markers["cycle"] = pd.to_numeric(parts["cycle"]).astype("Int64")
+    # Stable sort keeps the logging order of markers within the same second.
+    return markers.sort_values("wall", kind="stable").reset_index(drop=True)
+
+
+def wall_clock(path, time_axis):
+    """Unix seconds of every entry of ``time_axis`` (seconds from the first sample of ``path``)."""
+    if path.endswith(".bin"):
+        reader = SessionReader(path)
+        device_time = np.asarray(reader.records["device_time"], dtype=np.float64)
+        wall = reader.wall_time(reader.records["host_ns"])
+        return np.interp(time_axis, device_time - device_time[0], wall)
+    duration = time_axis[-1] if len(time_axis) else 0.0
+    return os.stat(path).st_mtime - duration + np.asarray(time_axis, dtype=np.float64)
+
+
+def epoch_bounds(marker_walls, end):
+    """[start, stop) of every marker epoch: each one ends at the next marker or at ``end``."""
+    starts = np.asarray(marker_walls, dtype=np.float64)
+    stops = np.append(starts[1:], max(end, starts[-1]) if len(starts) else end)
+    return starts, stops
+
+
+def stroop_path(ppg_path, when):
+    """participant_{id}_stroop_results_{when}.csv ("before" or "after") next to a recording."""
+    experiment, participant = file_identity(ppg_path)
+    return os.path.join(os.path.dirname(ppg_path), f"participant_{participant}_stroop_results_{when}.csv")
+
+
+def stroop_span(path):
+    """(start, end) Unix seconds of a Stroop run.
+
+    stroop.py writes the results file once, right after the last trial, so the
+    run ends at the file's modification time and lasts one ISI per row.
+    """
+    with open(path) as f:
+        trials = max(sum(1 for line in f if line.strip()) - 1, 0)
+    end = os.stat(path).st_mtime
+    return end - STROOP_TRIAL_SECONDS * trials, end
+
+
+def phase_sources(ppg_path):
+    """Existing files phase_bounds reads; a CSV recording's own start comes from its mtime."""
+    candidates = [marker_path(ppg_path), stroop_path(ppg_path, "before"), stroop_path(ppg_path, "after")]
+    if not ppg_path.endswith(".bin"):
+        candidates.append(ppg_path)
+    return [candidate for candidate in candidates if os.path.exists(candidate)]
+
+
+def phase_signature(ppg_path):
+    """Name, mtime and size of every phase source; part of the cache keys of per-phase results."""
+    signature = []
+    for source in phase_sources(ppg_path):
+        stat = os.stat(source)
+        signature.append([os.path.basename(source), stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def phase_bounds(path, time_axis):
+    """Measured {phase: (start, stop)} of a session, in seconds on the recording's ``time_axis``.
+
+    stroop_before / stroop_after come from the Stroop result files (stroop_span),
+    meditation runs from the first to the last marker and the break from the end
+    of stroop_before to the first marker. Bounds are clipped to the recording. A
+    phase without evidence is left out, and so is a Stroop run that doesn't fit
+    around the markers (e.g. a results file whose mtime changed when it was copied).
+    """
+    if not len(time_axis):
+        return {}
+    walls = {}
+    first = last = None
+    markers_file = marker_path(path)
+    if os.path.exists(markers_file):
+        markers = load_markers(markers_file)
+        if not markers.empty:
+            first, last = markers["wall"].iloc[0], markers["wall"].iloc[-1]
+            if last > first:
+                walls["meditation"] = (first, last)
+    for when in ("before", "after"):
+        source = stroop_path(path, when)
+        if not os.path.exists(source):
+            continue
+        start, end = stroop_span(source)
+        fits = first is None or (end <= first + MARKER_RESOLUTION if when == "before"
+                                 else start >= last - MARKER_RESOLUTION)
+        if end > start and fits:
+            walls[f"stroop_{when}"] = (start, end)
+    if "stroop_before" in walls and first is not None and first > walls["stroop_before"][1]:
+        walls["break"] = (walls["stroop_before"][1], first)
+
+    # Clipped to the recording; a phase it doesn't overlap is left out.
+    recording_start = wall_clock(path, time_axis[[0, -1]])[0]
+    bounds = {}
+    for phase in PHASES:
+        if phase in walls:
+            start = max(float(walls[phase][0] - recording_start), float(time_axis[0]))
+            stop = min(float(walls[phase][1] - recording_start), float(time_axis[-1]))
+            if stop > start:
+                bounds[phase] = (start, stop)
+    return bounds
+
+
+def participant_epochs(path):
+    """One row per marker epoch of a recording, or an empty frame without a marker log."""
+    markers_file = marker_path(path)
+    if not os.path.exists(markers_file):
+        return pd.DataFrame()
+    markers = load_markers(markers_file)
+    time_axis, ppg, fs = load_ppg(path)
+    if markers.empty or len(ppg) <= 3 * (2 * FILTER_ORDER + 1):
+        return pd.DataFrame()
+
+    filtered = bandpass_filter(ppg, LOWCUT, HIGHCUT, fs, FILTER_ORDER)
+    peaks, valid, _ = detect_clean_heartbeats(ppg, filtered, fs)
+    peak_walls = wall_clock(path, time_axis[peaks])
+    intervals = np.diff(peak_walls)
+    valid &= (intervals >= MIN_IBI) & (intervals <= MAX_IBI)
+    ibi_times, ibis, successive = beat_intervals(peak_walls, valid)
+
+    recording_start, recording_end = wall_clock(path, time_axis[[0, -1]])
+    starts, stops = epoch_bounds(markers["wall"].to_numpy(), recording_end)
+    stats = window_stats(ibi_times, ibis, starts, stops, successive)
+
+    experiment, participant = file_identity(path)
+    epochs = markers[["event", "kind", "label", "cycle"]].copy()
+    epochs.insert(0, "experiment", experiment)
+    epochs.insert(1, "participant", participant)
+    epochs.insert(2, "epoch", np.arange(len(markers)))
+    epochs["start_s"] = starts - recording_start
+    epochs["duration_s"] = stops - starts
+    epochs["in_recording"] = (starts >= recording_start) & (starts < recording_end)
+    for metric, values in stats.items():
+        epochs[metric] = values
+    return epochs
+
+
+def study_epochs(root=DATA_ROOT, workers=None):
+    """participant_epochs for every recording under ``root``, concatenated."""
+    paths = discover(root)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = [frame for frame in pool.map(participant_epochs, paths) if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def epoch_types(epochs):
+    """Mean / spread of the epoch metrics per (experiment, kind, label) across participants."""
+    metrics = ["duration_s", "n_beats", "hr_bpm", "sdnn_ms", "rmssd_ms", "pnn50"]
+    valid = epochs[epochs["in_recording"]]
+    table = valid.groupby(["experiment", "kind", "label"], sort=True)[metrics].agg(["mean", "std"])
+    table.columns = [f"{metric}_{stat}" for metric, stat in table.columns]
+    table.insert(0, "epochs", valid.groupby(["experiment", "kind", "label"], sort=True).size())
+    return table.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-marker HR/HRV epochs for every participant.")
+    parser.add_argument("--root", default=DATA_ROOT)
+    parser.add_argument("--out", default=EPOCHS_FILE)
+    parser.add_argument("--types-out", default=EPOCH_TYPES_FILE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    epochs = study_epochs(args.root, args.workers)
+    if epochs.empty:
+        print(f"⚠️ No PPG recordings with marker logs found under {args.root}.")
+    else:
+        epochs.to_csv(args.out, index=False)
+        epoch_types(epochs).to_csv(args.types_out, index=False)
+        print(f"✅ {len(epochs)} epochs from {epochs['participant'].nunique()} participants in {args.out}")
@@ -143,6 +143,57 @@ def activate_discrete(panel: str, motor_index: int, intensity: int, duration_ms:
         print(f"Error activating motor: {e}")
         return False
 
+def activate_discrete_frame(panels: dict, duration_ms: int):
+    """
+    Activates many motors on both panels with a single websocket message.
+
+    Instead of one message per motor (as activate_discrete would need), each
+    panel gets one dot frame and both frames go out in one batched Submit.
+
+    Args:
+        panels (dict): Maps 'front' and/or 'back' to a list of
+            (motor_index, intensity) pairs; motors that are left out stay off
+        duration_ms (int): Duration of vibration in milliseconds
+
+    Returns:
+        bool: True if activation was successful, False otherwise
+    """
+    # Input validation
+    for panel, motors in panels.items():
+        if panel.lower() not in ['front', 'back']:
+            print("Error: Panel must be either 'front' or 'back'")
+            return False
+        for motor_index, intensity in motors:
+            if not (0 <= motor_index <= 19):
+                print("Error: Motor index must be between 0 and 19")
+                return False
+            if not (0 <= intensity <= 100):
+                print("Error: Intensity must be between 0 and 100")
+                return False
+
+    if duration_ms <= 0:
+        print("Error: Duration must be positive")
+        return False
+
+    try:
+        with player.FrameBatch() as batch:
+            for panel, motors in panels.items():
+                if not motors:
+                    continue
+                panel_value = (BhapticsPosition.VestFront.value if panel.lower() == 'front'
+                               else BhapticsPosition.VestBack.value)
+                # One frame (and key) per panel, so front and back play together
+                batch.add_dot(f"{panel.lower()}Frame_array", panel_value, [
+                    {"index": motor_index, "intensity": intensity}
+                    for motor_index, intensity in motors
+                ], duration_ms)
+
+        return True
+
+    except Exception as e:
+        print(f"Error activating motors: {e}")
+        return False
+
 def test_funnelling():
     """Interactive test function for the funnelling effect activation method."""
     print("\nbHaptics Funnelling Effect Test")
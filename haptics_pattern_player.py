@@ -6,7 +6,12 @@ Description:
     This module demonstrates how to load and play a haptic tact file on the bHaptics jacket/tactsuit.
     The specified tact file "AIMlab_Haptics_Jacket_Patterns.tact" is registered and played exactly once.
     Detailed debugging information is printed to the console and all potential exceptions are caught and logged.
-    During playback, the percentage of the total pattern completed is displayed.
+    Optionally, the call blocks until the player reports that the pattern has finished.
+
+    Patterns are parsed once and kept in a cache keyed by file, together with a
+    content hash. A key is only (re-)registered with the player when it does not
+    hold that exact content yet, so after preload_patterns() a trigger sends just
+    the small Submit message.
     
 Usage:
     Install dependencies if you haven't already:
@@ -16,31 +21,89 @@ Usage:
         $ python haptics_pattern_player.py
 """
 
+import glob
+import json
+import os
 from time import sleep
 from bhaptics import better_haptic_player as player
 from bhaptics.better_haptic_player import BhapticsPosition
 
-def load_and_play_tact_file(tact_key="Breathing Haptics3", tact_file="LMV.tact"):
+PATTERN_DIR = "patterns"
+
+# tact file path -> ((mtime_ns, size), content hash, parsed project)
+_pattern_cache = {}
+
+
+def load_pattern(tact_file, pattern_dir=PATTERN_DIR):
+    """(content hash, project) of a .tact file; only re-read when the file changes on disk."""
+    path = os.path.join(pattern_dir, tact_file)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _pattern_cache.get(path)
+    if cached is None or cached[0] != signature:
+        with open(path, "rb") as f:
+            json_data = f.read()
+        cached = (signature, player.project_digest(json_data), json.loads(json_data)["project"])
+        _pattern_cache[path] = cached
+    return cached[1], cached[2]
+
+
+def ensure_registered(tact_key, tact_file, pattern_dir=PATTERN_DIR):
+    """Register ``tact_file`` under ``tact_key`` unless the player already holds that content.
+
+    Returns True if a Register message was sent.
+    """
+    digest, project = load_pattern(tact_file, pattern_dir)
+    if player.is_registered(tact_key, digest):
+        return False
+    player.register_project(tact_key, project, digest)
+    return True
+
+
+def preload_patterns(patterns=None, pattern_dir=PATTERN_DIR):
+    """Parse and register patterns up front, e.g. at startup.
+
+    ``patterns`` maps registration keys to tact files; by default every .tact
+    file in ``pattern_dir`` is registered under its file name without extension.
+    Returns the number of keys that were (re-)registered.
+    """
+    if patterns is None:
+        patterns = {os.path.splitext(os.path.basename(path))[0]: os.path.basename(path)
+                    for path in sorted(glob.glob(os.path.join(pattern_dir, "*.tact")))}
+    if not player.is_started():
+        player.initialize()
+    return sum(ensure_registered(key, tact_file, pattern_dir) for key, tact_file in patterns.items())
+
+
+def load_and_play_tact_file(tact_key="Breathing Haptics3", tact_file="LMV.tact", wait=None):
     """
     Loads and plays the haptic tact file for the bHaptics suit.
     
     This function performs the following steps:
         1. Initializes the bHaptics haptic player.
         2. Registers the specified tact file ("AIMlab_Haptics_Jacket_Patterns.tact")
-           under a designated registration key.
+           under a designated registration key, unless the player already holds
+           the same content under that key (see preload_patterns).
         3. Prints device connection statuses for debugging purposes.
         4. Submits the registered tact pattern for playback.
-        5. Monitors the playback status and prints debug messages, including the
-           percentage of the total pattern completed, until the pattern finishes playing.
+        5. If ``wait`` is given, blocks until the player reports that the pattern
+           has finished, for at most ``wait`` seconds.
     
     All steps are wrapped in try/except blocks to handle any exceptions that may occur.
+
+    Args:
+        tact_key (str): Registration key of the pattern
+        tact_file (str): File name inside the patterns/ directory
+        wait (float): Seconds to wait for the pattern to finish, or None to return
+            right after submitting
     
     Returns:
         None
     """
     # STEP 1: Initialize the bHaptics haptic player.
-    
-    if not player.is_initialized():
+    # Only when there is no client yet: a client that is reconnecting replays the
+    # registrations by itself, and initialize() would block on its connect wait.
+    if not player.is_started():
         try:
             print("Initializing the bHaptics haptic player...")
             player.initialize()
@@ -51,9 +114,8 @@ def load_and_play_tact_file(tact_key="Breathing Haptics3", tact_file="LMV.tact")
 
 
     try:
-        print(f"Registering tact file '{tact_file}' with key '{tact_key}'...")
-        player.register(tact_key, f"patterns/{tact_file}")
-        print("Registration successful.")
+        if ensure_registered(tact_key, tact_file):
+            print(f"Registered tact file '{tact_file}' with key '{tact_key}'.")
     except Exception as reg_error:
         print("Error during registration of tact file:", reg_error)
         return  # Exit if registration fails
@@ -84,33 +146,15 @@ def load_and_play_tact_file(tact_key="Breathing Haptics3", tact_file="LMV.tact")
         print("Error during submission of tact pattern for playback:", submit_error)
         return  # Exit if submission fails
 
-    # STEP 5: Monitor playback status until the pattern finishes playing.
-    # try:
-    #     print("Monitoring playback status...")
-    #     # Define the expected total duration for the pattern in seconds.
-    #     # This value is used to calculate the percentage of completion.
-    #     max_duration = 10.0  # seconds (adjust this value to the known pattern duration if available)
-    #     elapsed_time = 0.0
-    #     poll_interval = 0.5  # seconds
-        
-    #     # Continuously poll the playback status using the registration key.
-    #     while player.is_playing_key(tact_key) and elapsed_time < max_duration:
-    #         # Compute percentage complete based on the elapsed time.
-    #         percent_complete = min((elapsed_time / max_duration) * 100, 100)
-    #         print(f"Pattern '{tact_key}' is playing... {elapsed_time:.1f} seconds elapsed. {percent_complete:.0f}% complete.")
-    #         sleep(poll_interval)
-    #         elapsed_time += poll_interval
-        
-    #     # After exiting the loop, check if playback has finished normally.
-    #     if not player.is_playing_key(tact_key):
-    #         # If the pattern stopped before max_duration, assume the pattern is fully played.
-    #         print("Playback completed successfully. 100% complete.")
-    #     else:
-    #         # If the maximum duration is reached but the pattern is still playing, report the current progress.
-    #         percent_complete = min((elapsed_time / max_duration) * 100, 100)
-    #         print(f"Maximum wait time reached; playback might still be in progress or stalled. Final progress: {percent_complete:.0f}% complete.")
-    # except Exception as monitor_error:
-    #     print("Error while monitoring playback status:", monitor_error)
+    # STEP 5: Optionally wait for the pattern to finish playing.
+    if wait is not None:
+        try:
+            if player.wait_until_finished(tact_key, timeout=wait):
+                print(f"Pattern '{tact_key}' finished playing.")
+            else:
+                print(f"Pattern '{tact_key}' still playing after {wait} seconds.")
+        except Exception as monitor_error:
+            print("Error while waiting for playback to finish:", monitor_error)
 
 # print("Exiting haptics playback function.")
 
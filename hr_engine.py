@@ -0,0 +1,106 @@
+"""
+Streaming heart-rate estimation for the PPG recorder.
+
+Blocks of raw PPG go through a causal Butterworth band-pass in SOS form whose
+filter state is carried from block to block, then through an online peak
+detector with an adaptive amplitude threshold and a refractory period. Accepted
+beats give inter-beat intervals (IBIs); ``publish()`` is called once a second by
+the recorder and returns the current BPM and the IBIs seen since the last call.
+
+The band matches analyze_ppg.py so live and offline numbers are comparable.
+"""
+
+from collections import deque
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+LOWCUT = 0.5  # Hz
+HIGHCUT = 3.0  # Hz
+ORDER = 3
+REFRACTORY = 0.33  # seconds, ~180 BPM
+MIN_IBI = 0.33  # seconds
+MAX_IBI = 2.0  # seconds
+SETTLE_TIME = 2.0  # seconds of filter warm-up ignored by the peak detector
+LEVEL_HALF_LIFE = 2.0  # seconds for the peak-amplitude estimate to halve without beats
+THRESHOLD = 0.4  # fraction of the running peak amplitude a candidate must reach
+
+
+class StreamingHeartRate:
+    """Causal band-pass + online peak detector over consecutive sample blocks.
+
+    Args:
+        fs (float): Sampling rate in Hz.
+        history (int): Number of recent IBIs the BPM median is taken over.
+    """
+
+    def __init__(self, fs, lowcut=LOWCUT, highcut=HIGHCUT, order=ORDER,
+                 refractory=REFRACTORY, history=8):
+        self.fs = fs
+        self.refractory = refractory
+        self.sos = butter(order, [lowcut, highcut], btype="band", fs=fs, output="sos")
+        self._zi_unit = sosfilt_zi(self.sos)
+        self.zi = None
+        self.start_time = None
+        self.level = None
+        self.last_peak = None
+        self.beats = 0
+        self.ibis = deque(maxlen=history)
+        self._new_ibis = []
+        # Last two filtered samples of the previous block, so maxima on a block
+        # boundary are still found.
+        self._tail_y = np.empty(0)
+        self._tail_t = np.empty(0)
+
+    def process(self, times, values):
+        """Filter one block and update beats. ``times`` are seconds on a monotonic clock."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        if self.zi is None:
+            self.zi = self._zi_unit * values[0]
+            self.start_time = times[0]
+        filtered, self.zi = sosfilt(self.sos, values, zi=self.zi)
+
+        y = np.concatenate((self._tail_y, filtered))
+        t = np.concatenate((self._tail_t, times))
+        self._tail_y, self._tail_t = y[-2:], t[-2:]
+        if self.level is not None:
+            self.level *= 0.5 ** ((times[-1] - times[0] + 1.0 / self.fs) / LEVEL_HALF_LIFE)
+        if len(y) < 3:
+            return
+
+        mid = y[1:-1]
+        candidates = np.flatnonzero((mid > y[:-2]) & (mid >= y[2:]) & (mid > 0)) + 1
+        for i in candidates:
+            self._candidate(t[i], y[i])
+
+    def _candidate(self, peak_time, amplitude):
+        if peak_time - self.start_time < SETTLE_TIME:
+            return
+        if self.level is not None and amplitude < THRESHOLD * self.level:
+            return
+        if self.last_peak is not None and peak_time - self.last_peak < self.refractory:
+            return
+        if self.last_peak is not None:
+            ibi = peak_time - self.last_peak
+            if MIN_IBI <= ibi <= MAX_IBI:
+                self.ibis.append(ibi)
+                self._new_ibis.append(ibi)
+        self.level = amplitude if self.level is None else 0.875 * self.level + 0.125 * amplitude
+        self.last_peak = peak_time
+        self.beats += 1
+
+    @property
+    def bpm(self):
+        return 60.0 / float(np.median(self.ibis)) if self.ibis else None
+
+    def publish(self):
+        """Return the current estimate and the IBIs (ms) accepted since the last call."""
+        result = {
+            "bpm": self.bpm,
+            "ibi_ms": [round(ibi * 1000.0, 1) for ibi in self._new_ibis],
+            "beats": self.beats,
+        }
+        self._new_ibis = []
+        return result
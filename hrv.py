@@ -0,0 +1,140 @@
+"""
+Vectorised heart-rate-variability metrics over sliding windows.
+
+Time-domain metrics (mean HR, SDNN, RMSSD, pNN50) for any set of [start, stop)
+windows come from prefix sums of the inter-beat intervals: each window is two
+``searchsorted`` lookups and a handful of array subtractions, with no Python loop
+over windows. Frequency-domain metrics (LF, HF, LF/HF) resample the IBI series
+onto an even grid, take every window at once as a strided view and run one
+``scipy.signal.welch`` call along the last axis.
+
+Usage:
+    from hrv import sliding_hrv
+    table = sliding_hrv(peak_times, window=60.0, step=5.0)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.signal import welch
+
+RESAMPLE_FS = 4.0  # Hz, even grid for the IBI series
+LF_BAND = (0.04, 0.15)  # Hz
+HF_BAND = (0.15, 0.40)  # Hz
+NN50 = 0.050  # s
+
+
+def beat_intervals(peak_times, valid=None):
+    """Return (time of each interval's closing beat, interval in seconds, successive mask).
+
+    ``valid`` optionally marks intervals to keep (e.g. both beats in clean signal).
+    The successive mask is the ``successive`` argument of window_stats.
+    """
+    peak_times = np.asarray(peak_times, dtype=np.float64)
+    ibi_times, ibis = peak_times[1:], np.diff(peak_times)
+    if valid is None:
+        return ibi_times, ibis, np.ones(max(len(ibis) - 1, 0), dtype=bool)
+    kept = np.flatnonzero(valid)
+    return ibi_times[kept], ibis[kept], np.diff(kept) == 1
+
+
+def window_stats(ibi_times, ibis, starts, stops, successive=None):
+    """Time-domain HRV for every [start, stop) window in one pass.
+
+    Args:
+        ibi_times (np.ndarray): Sorted time stamp of each interval.
+        ibis (np.ndarray): Intervals in seconds.
+        starts, stops (np.ndarray): Window bounds in the same time base.
+        successive (np.ndarray): Optional bool mask, ``successive[i]`` is True when
+            interval ``i + 1`` directly follows interval ``i`` (no rejected beat in
+            between); only those pairs count towards RMSSD and pNN50.
+
+    Returns:
+        dict of arrays: n_beats, hr_bpm, mean_ibi_ms, sdnn_ms, rmssd_ms, pnn50.
+    """
+    ibi_times = np.asarray(ibi_times, dtype=np.float64)
+    ibis = np.asarray(ibis, dtype=np.float64)
+    lo = np.searchsorted(ibi_times, starts, side="left")
+    hi = np.searchsorted(ibi_times, stops, side="left")
+    n = hi - lo
+
+    # Centre before the prefix sums so the variance difference does not cancel badly.
+    centre = ibis.mean() if len(ibis) else 0.0
+    x = ibis - centre
+    s1 = np.concatenate(([0.0], np.cumsum(x)))
+    s2 = np.concatenate(([0.0], np.cumsum(x * x)))
+
+    diffs = np.diff(ibis)
+    pair_ok = np.ones(len(diffs), dtype=bool) if successive is None else np.asarray(successive, dtype=bool)
+    d2 = np.concatenate(([0.0], np.cumsum(np.where(pair_ok, diffs * diffs, 0.0))))
+    nn50 = np.concatenate(([0], np.cumsum(pair_ok & (np.abs(diffs) > NN50))))
+    pairs = np.concatenate(([0], np.cumsum(pair_ok)))
+    # Pairs inside a window are diffs[lo:hi-1].
+    pair_lo = np.minimum(lo, len(pairs) - 1)
+    pair_hi = np.clip(hi - 1, pair_lo, len(pairs) - 1)
+    n_pairs = pairs[pair_hi] - pairs[pair_lo]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (s1[hi] - s1[lo]) / n + centre
+        var = ((s2[hi] - s2[lo]) - (s1[hi] - s1[lo]) ** 2 / n) / (n - 1)
+        rmssd = np.sqrt((d2[pair_hi] - d2[pair_lo]) / n_pairs)
+        pnn50 = (nn50[pair_hi] - nn50[pair_lo]) / n_pairs
+    mean = np.where(n > 0, mean, np.nan)
+    return {
+        "n_beats": n,
+        "hr_bpm": 60.0 / mean,
+        "mean_ibi_ms": mean * 1e3,
+        "sdnn_ms": np.where(n > 1, np.sqrt(np.maximum(var, 0.0)), np.nan) * 1e3,
+        "rmssd_ms": np.where(n_pairs > 0, rmssd, np.nan) * 1e3,
+        "pnn50": np.where(n_pairs > 0, pnn50, np.nan),
+    }
+
+
+def band_power(ibi_times, ibis, starts, window, resample_fs=RESAMPLE_FS):
+    """LF and HF power (ms^2) of the resampled IBI series for windows [start, start + window)."""
+    starts = np.asarray(starts, dtype=np.float64)
+    nan = np.full(len(starts), np.nan)
+    length = int(round(window * resample_fs))
+    if len(ibis) < 2 or length < 8:
+        return nan, nan.copy()
+    grid = np.arange(ibi_times[0], ibi_times[-1], 1.0 / resample_fs)
+    if len(grid) < length:
+        return nan, nan.copy()
+    series = np.interp(grid, ibi_times, ibis) * 1e3
+    first = np.ceil((starts - grid[0]) * resample_fs).astype(np.int64)
+    usable = (first >= 0) & (first + length <= len(grid))
+    if not usable.any():
+        return nan, nan.copy()
+    segments = np.lib.stride_tricks.sliding_window_view(series, length)[first[usable]]
+    freqs, psd = welch(segments, fs=resample_fs, nperseg=length, axis=-1)
+
+    def integrate(band):
+        mask = (freqs >= band[0]) & (freqs < band[1])
+        return np.trapezoid(psd[:, mask], freqs[mask], axis=-1)
+
+    lf, hf = nan.copy(), nan.copy()
+    lf[usable] = integrate(LF_BAND)
+    hf[usable] = integrate(HF_BAND)
+    return lf, hf
+
+
+def sliding_hrv(peak_times, window=60.0, step=5.0, start=None, stop=None, valid=None):
+    """HRV table over sliding windows of ``window`` seconds every ``step`` seconds.
+
+    Returns a DataFrame with one row per window: start, end, n_beats, hr_bpm,
+    mean_ibi_ms, sdnn_ms, rmssd_ms, pnn50, lf_ms2, hf_ms2, lf_hf.
+    """
+    ibi_times, ibis, successive = beat_intervals(peak_times, valid)
+    peak_times = np.asarray(peak_times, dtype=np.float64)
+    if start is None:
+        start = ibi_times[0] if len(ibi_times) else 0.0
+    if stop is None:
+        stop = peak_times[-1] if len(peak_times) else 0.0
+    starts = np.arange(start, max(stop - window, start) + 1e-9, step)
+    stops = starts + window
+    table = {"start": starts, "end": stops}
+    table.update(window_stats(ibi_times, ibis, starts, stops, successive))
+    lf, hf = band_power(ibi_times, ibis, starts, window)
+    table["lf_ms2"], table["hf_ms2"] = lf, hf
+    with np.errstate(invalid="ignore", divide="ignore"):
+        table["lf_hf"] = lf / hf
+    return pd.DataFrame(table)
@@ -0,0 +1,261 @@
+"""
+Incremental analysis pipeline for the whole study.
+
+Stages, per PPG recording:
+    load     raw time / PPG samples                    -> load.npz
+    filter   zero-phase band-pass                      -> filter.npz
+    peaks    SQI-gated beat detection (ppg_quality.py)  -> peaks.npz, quality.csv
+    hrv      sliding-window HRV and the summary row    -> hrv.csv, summary.json
+and once for the study:
+    stroop   stroop_analysis.aggregate                 -> {root}/stroop_summary.csv
+    merge    PPG summary rows joined with Stroop       -> {root}/ppg_summary.csv, {root}/study_summary.csv
+
+Every output lives under the study root (``--root``, ./data by default), so
+running on another study tree never touches ./data. Per-recording artifacts live
+in ``{root}/.pipeline/{experiment}/participant_{id}/``.
+``{root}/.pipeline/manifest.json`` records, for every recording, the content hash of
+the input file and a key per stage: the hash of the stage parameters and the key
+of the stage before it. A stage reruns only when its key changed or its artifact
+is missing, so editing e.g. PEAK_PROMINENCE reruns peaks and hrv but not load or
+filter. The hrv key also covers the marker log and Stroop files the phase
+bounds are measured from (epochs.phase_bounds). Recordings are independent and run in a process pool; only the parent
+writes the manifest.
+
+The notebook only needs to read the merged tables:
+    summary = pd.read_csv("./data/study_summary.csv")
+
+Usage:
+    $ python pipeline.py                   # everything that is out of date
+    $ python pipeline.py --until peaks     # stop after the peaks stage
+    $ python pipeline.py --force           # ignore the manifest
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import analyze_ppg
+import stroop_analysis
+from analyze_ppg import (
+    DATA_ROOT, bandpass_filter, detect_clean_heartbeats, discover, file_hash, file_identity, load_ppg,
+)
+from epochs import phase_bounds, phase_signature
+from hrv import sliding_hrv
+from ppg_quality import sqi_params
+
+PIPELINE_DIRNAME = ".pipeline"
+PIPELINE_DIR = os.path.join(DATA_ROOT, PIPELINE_DIRNAME)  # default for the per-recording helpers
+MANIFEST_FILE = "manifest.json"
+# Study-level outputs, written next to the experiment folders of --root.
+PPG_SUMMARY_NAME = analyze_ppg.SUMMARY_NAME
+STROOP_SUMMARY_NAME = os.path.basename(stroop_analysis.SUMMARY_FILE)
+STUDY_SUMMARY_NAME = "study_summary.csv"
+RECORDING_STAGES = ["load", "filter", "peaks", "hrv"]
+STAGES = RECORDING_STAGES + ["stroop", "merge"]
+ARTIFACTS = {
+    "load": ["load.npz"],
+    "filter": ["filter.npz"],
+    "peaks": ["peaks.npz", "quality.csv"],
+    "hrv": ["hrv.csv", "summary.json"],
+}
+
+
+def stage_params():
+    """Parameters each per-recording stage depends on; part of its manifest key."""
+    return {
+        "load": {"version": 1},
+        "filter": {"lowcut": analyze_ppg.LOWCUT, "highcut": analyze_ppg.HIGHCUT, "order": analyze_ppg.FILTER_ORDER},
+        "peaks": {"prominence": analyze_ppg.PEAK_PROMINENCE, "sqi": sqi_params()},
+        "hrv": {"window": analyze_ppg.HRV_WINDOW, "step": analyze_ppg.HRV_STEP,
+                "ibi_range": [analyze_ppg.MIN_IBI, analyze_ppg.MAX_IBI], "phases": analyze_ppg.PHASES},
+    }
+
+
+def stage_keys(content_hash, params):
+    """Chained key per stage: a change upstream invalidates everything downstream."""
+    keys, previous = {}, content_hash
+    for stage in RECORDING_STAGES:
+        blob = json.dumps([previous, params[stage]], sort_keys=True).encode()
+        keys[stage] = previous = hashlib.sha1(blob).hexdigest()
+    return keys
+
+
+def recording_dir(path, pipeline_dir=PIPELINE_DIR):
+    experiment, participant = file_identity(path)
+    return os.path.join(pipeline_dir, experiment, f"participant_{participant}")
+
+
+def content_hash(path, previous):
+    """File hash, reusing the manifest's value while the file's mtime and size are unchanged."""
+    stat = os.stat(path)
+    signature = [stat.st_mtime_ns, stat.st_size]
+    if previous and previous.get("signature") == signature:
+        return previous["hash"], signature
+    return file_hash(path), signature
+
+
+def _save_npz(path, **arrays):
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def run_recording(path, previous, until="hrv", pipeline_dir=PIPELINE_DIR, force=False):
+    """Bring one recording's stages up to date; returns (its new manifest entry, stages run)."""
+    out_dir = recording_dir(path, pipeline_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    digest, signature = content_hash(path, previous)
+    params = stage_params()
+    params["hrv"] = dict(params["hrv"], phase_sources=phase_signature(path))
+    keys = stage_keys(digest, params)
+    done = {} if force or not previous else dict(previous.get("stages", {}))
+    ran = []
+
+    def fresh(stage):
+        return done.get(stage) == keys[stage] and all(
+            os.path.exists(os.path.join(out_dir, name)) for name in ARTIFACTS[stage])
+
+    def artifact(name):
+        return os.path.join(out_dir, name)
+
+    time = ppg = fs = filtered = peak_times = valid = sqi_pass = None
+    for stage in RECORDING_STAGES[:RECORDING_STAGES.index(until) + 1]:
+        if fresh(stage):
+            continue
+        if stage == "load":
+            time, ppg, fs = load_ppg(path)
+            _save_npz(artifact("load.npz"), time=time, ppg=ppg, fs=fs)
+        elif stage == "filter":
+            if ppg is None:
+                with np.load(artifact("load.npz")) as cached:
+                    time, ppg, fs = cached["time"], cached["ppg"], float(cached["fs"])
+            if len(ppg) > 3 * (2 * analyze_ppg.FILTER_ORDER + 1):
+                filtered = bandpass_filter(ppg, analyze_ppg.LOWCUT, analyze_ppg.HIGHCUT, fs, analyze_ppg.FILTER_ORDER)
+            else:
+                filtered = np.zeros(0)
+            _save_npz(artifact("filter.npz"), filtered=filtered)
+        elif stage == "peaks":
+            if filtered is None:
+                with np.load(artifact("filter.npz")) as cached:
+                    filtered = cached["filtered"]
+            if ppg is None:
+                with np.load(artifact("load.npz")) as cached:
+                    time, ppg, fs = cached["time"], cached["ppg"], float(cached["fs"])
+            if len(filtered):
+                peaks, valid, quality = detect_clean_heartbeats(ppg, filtered, fs)
+                sqi_pass = float(quality["passed"].mean())
+            else:
+                peaks, valid, quality, sqi_pass = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), None, 0.0
+            peak_times = time[peaks]
+            _save_npz(artifact("peaks.npz"), peaks=peaks, peak_times=peak_times, valid=valid, sqi_pass=sqi_pass)
+            (quality if quality is not None else pd.DataFrame()).to_csv(artifact("quality.csv"), index=False)
+        elif stage == "hrv":
+            if peak_times is None:
+                with np.load(artifact("peaks.npz")) as cached:
+                    peak_times, valid, sqi_pass = cached["peak_times"], cached["valid"], float(cached["sqi_pass"])
+                with np.load(artifact("load.npz")) as cached:
+                    time, fs = cached["time"], float(cached["fs"])
+            sliding_hrv(peak_times, analyze_ppg.HRV_WINDOW, analyze_ppg.HRV_STEP, valid=valid).to_csv(
+                artifact("hrv.csv"), index=False)
+            row = analyze_ppg.recording_row(path, time, fs)
+            if len(peak_times):
+                row = analyze_ppg.summarise_beats(row, peak_times, valid, sqi_pass, phase_bounds(path, time))
+            else:
+                row.update(beats=0, hr_bpm=None, quality=0.0)
+            with open(artifact("summary.json"), "w") as f:
+                json.dump(row, f)
+        done[stage] = keys[stage]
+        ran.append(stage)
+    return {"hash": digest, "signature": signature, "stages": done}, ran
+
+
+def load_manifest(pipeline_dir=PIPELINE_DIR):
+    path = os.path.join(pipeline_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, pipeline_dir=PIPELINE_DIR):
+    path = os.path.join(pipeline_dir, MANIFEST_FILE)
+    os.makedirs(pipeline_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def pipeline_dir_for(root):
+    return os.path.join(root, PIPELINE_DIRNAME)
+
+
+def merge(paths, pipeline_dir=PIPELINE_DIR, stroop=None, root=DATA_ROOT):
+    """PPG summary rows from the hrv stage, joined with the Stroop table per participant.
+
+    Writes ppg_summary.csv and study_summary.csv under ``root``.
+    """
+    rows = []
+    for path in paths:
+        summary = os.path.join(recording_dir(path, pipeline_dir), "summary.json")
+        if os.path.exists(summary):
+            with open(summary) as f:
+                rows.append(json.load(f))
+    ppg = pd.DataFrame(rows)
+    if not ppg.empty:
+        ppg = ppg.sort_values(["experiment", "participant"])
+        ppg.to_csv(os.path.join(root, PPG_SUMMARY_NAME), index=False)
+    stroop_file = os.path.join(root, STROOP_SUMMARY_NAME)
+    if stroop is None and os.path.exists(stroop_file):
+        stroop = pd.read_csv(stroop_file, dtype={"participant": str})
+    if stroop is None or stroop.empty:
+        study = ppg
+    else:
+        metrics = ["accuracy", "omission_rate", "commission_rate", "d_prime", "rt_mean", "rt_q50"]
+        wide = stroop.pivot_table(index=["experiment", "participant"], columns="phase", values=metrics)
+        wide.columns = [f"stroop_{metric}_{phase}" for metric, phase in wide.columns]
+        wide = wide.reset_index()
+        study = wide if ppg.empty else ppg.merge(wide, on=["experiment", "participant"], how="outer")
+    study.to_csv(os.path.join(root, STUDY_SUMMARY_NAME), index=False)
+    return study
+
+
+def run(root=DATA_ROOT, until="merge", workers=None, force=False, pipeline_dir=None):
+    """Bring every stage up to ``until``; all outputs go under ``root`` (artifacts in root/.pipeline)."""
+    pipeline_dir = pipeline_dir or pipeline_dir_for(root)
+    paths = discover(root)
+    manifest = {} if force else load_manifest(pipeline_dir)
+    recording_until = until if until in RECORDING_STAGES else RECORDING_STAGES[-1]
+    keys = [os.path.relpath(path, root) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run_recording, paths, [manifest.get(key) for key in keys],
+                                [recording_until] * len(paths), [pipeline_dir] * len(paths),
+                                [force] * len(paths)))
+    manifest = {key: entry for key, (entry, _) in zip(keys, results)}  # drops deleted recordings
+    save_manifest(manifest, pipeline_dir)
+    updated = sum(1 for _, ran in results if ran)
+    print(f"✅ {len(paths)} recordings, {updated} updated (stages up to '{recording_until}')")
+
+    stroop = None
+    if STAGES.index(until) >= STAGES.index("stroop"):
+        stroop = stroop_analysis.aggregate(root, out=os.path.join(root, STROOP_SUMMARY_NAME), rebuild=force)
+    if until == "merge":
+        study = merge(paths, pipeline_dir, stroop, root)
+        print(f"✅ {len(study)} rows in {os.path.join(root, STUDY_SUMMARY_NAME)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental PPG + Stroop analysis pipeline.")
+    parser.add_argument("--root", default=DATA_ROOT)
+    parser.add_argument("--until", default="merge", choices=STAGES, help="last stage to run")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="recompute every stage")
+    args = parser.parse_args()
+
+    run(args.root, args.until, args.workers, args.force)
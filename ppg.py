@@ -5,16 +5,30 @@ from pyshimmer import ShimmerBluetooth, DEFAULT_BAUDRATE, DataPacket, EChannelTy
 from pyshimmer.dev.channels import ChDataTypeAssignment, ChannelDataType, EChannelType, ESensorGroup
 import numpy as np
 from pyshimmer.util import unwrap
-
-
+import signal
+from ppg_stream import BufferedPPGWriter, CHANNEL_SETS
+from ppg_ipc import StatsPublisher
+from shimmer_sim import SimulatedShimmer
+
+SAMPLING_RATE = 512.0  # Hz
+WRITER_MODE = "buffered"  # "csv" keeps the original per-packet text writer
+FLUSH_INTERVAL = 0.5  # seconds between block writes in buffered mode
+BUFFER_SECONDS = 30  # ring buffer capacity in buffered mode
+CHANNEL_SET = "ppg"  # key of ppg_stream.CHANNEL_SETS; "ppg3_ecg" records three PPG sites plus ECG
+LIVE_HEART_RATE = True  # print live HR from hr_engine in the buffered-mode summary line
+PUBLISH_STATS = True  # send each summary to run_experiment_gui.py over ppg_ipc
 
 participant_id = sys.argv[1] if len(sys.argv) > 1 else "test"
 experiment_id = sys.argv[2] if len(sys.argv) > 2 else "test"
+# Serial port of the sensor, or "sim" / "sim:<ppg csv to replay>" for shimmer_sim.SimulatedShimmer
+DEVICE = sys.argv[3] if len(sys.argv) > 3 else "COM4"
+SIM_SPEED = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0  # playback speed of the simulator
 DATA_FILE = f"./data/{experiment_id}/participant_{participant_id}_ppg_data.csv"
+SESSION_FILE = f"./data/{experiment_id}/participant_{participant_id}_ppg_session.bin"
+STATS_FILE = f"./data/{experiment_id}/participant_{participant_id}_ppg_stats.json"
 
-# def unwrap_device_timestamps(ts_dev: np.ndarray) -> np.ndarray:
-#     ts_dtype = ChDataTypeAssignment[EChannelType.TIMESTAMP]
-#     return unwrap(ts_dev, 2 ** (8 * ts_dtype.size))
+# Device timestamps are unwrapped and aligned to the host clock by
+# ppg_stream.ClockSync in buffered mode; the CSV mode still logs raw ticks.
 
 def handler(pkt: DataPacket, file_handle) -> None:
     try:
@@ -31,47 +45,68 @@ def handler(pkt: DataPacket, file_handle) -> None:
     file_handle.write(f"{packet_timestamp:.4f},{cur_value}\n")
     file_handle.flush()  # ensures data is actually written
 
-if __name__ == '__main__':
-    # Open the file in write mode (or "a" if you want to append)
-    with open(DATA_FILE, "w", buffering=1) as f:
-        f.write("TimeStamp,PPG(mV)\n")  # header line
+def stream(callback):
+    if DEVICE.startswith("sim"):
+        shim_dev = SimulatedShimmer(DEVICE[4:] or None, speed=SIM_SPEED)
+    else:
+        serial_conn = serial.Serial(DEVICE, DEFAULT_BAUDRATE)
+        shim_dev = ShimmerBluetooth(serial_conn)
+    shim_dev.initialize()
+
+    shim_dev.set_sampling_rate(SAMPLING_RATE)
+    sensors = CHANNEL_SETS[CHANNEL_SET]["sensors"] if WRITER_MODE != "csv" else None
+    if sensors is not None:
+        shim_dev.set_sensors(sensors)
+
+    print(f"Starting PPG data collection for Participant {participant_id}...")
+
+    shim_dev.add_stream_callback(callback)
+    shim_dev.start_streaming()
+    # status = shim_dev.get_status()
+    # print(status)
+    # sampling_rate = shim_dev.get_sampling_rate()
+    # print(f"Sampling rate: {sampling_rate} Hz")
+    # # shim_dev.set_rtc(time.time())
+    # print(shim_dev.get_data_types())
+    # print("Battery", shim_dev.get_battery_state(in_percent=True))
+
+    # main loop
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopping PPG data collection...")
+        shim_dev.stop_streaming()
+
 
+if __name__ == '__main__':
+    # run_experiment.py stops us with CTRL_BREAK_EVENT; turn it into KeyboardInterrupt
+    # so the buffered writer gets a chance to drain before exit.
+    if hasattr(signal, "SIGBREAK"):
+        signal.signal(signal.SIGBREAK, signal.default_int_handler)
+
+    if WRITER_MODE == "csv":
+        # Open the file in write mode (or "a" if you want to append)
+        with open(DATA_FILE, "w", buffering=1) as f:
+            f.write("TimeStamp,PPG(mV)\n")  # header line
+            try:
+                # Add a lambda or partial so we can pass 'f' to the handler
+                stream(lambda pkt: handler(pkt, f))
+            finally:
+                print(f"\n✅ Data continuously saved to {DATA_FILE}.")
+    else:
+        writer = BufferedPPGWriter(SESSION_FILE, SAMPLING_RATE, participant_id, experiment_id, CHANNEL_SET,
+                                   heart_rate=LIVE_HEART_RATE,
+                                   publisher=StatsPublisher() if PUBLISH_STATS else None,
+                                   stats_path=STATS_FILE,
+                                   capacity=int(SAMPLING_RATE * BUFFER_SECONDS),
+                                   flush_interval=FLUSH_INTERVAL)
+        writer.start()
         try:
-            
-            serial_conn = serial.Serial('COM4', DEFAULT_BAUDRATE)
-            shim_dev = ShimmerBluetooth(serial_conn)
-            shim_dev.initialize()
-
-            shim_dev.set_sampling_rate(512.0)
-
-            print(f"Starting PPG data collection for Participant {participant_id}...")
-           
-            
-            # Add a lambda or partial so we can pass 'f' and 'start_time_holder' to the handler
-            shim_dev.add_stream_callback(
-                lambda pkt: handler(pkt, f)
-            )
-            shim_dev.start_streaming()
-            # status = shim_dev.get_status()
-            # print(status)
-            # sampling_rate = shim_dev.get_sampling_rate()
-            # print(f"Sampling rate: {sampling_rate} Hz")
-            # # shim_dev.set_rtc(time.time())
-            # print(shim_dev.get_data_types())
-            # print("Battery", shim_dev.get_battery_state(in_percent=True))
-
-            # main loop
-            while True:
-                time.sleep(1)
-
-        except KeyboardInterrupt:
-            print("\nStopping PPG data collection...")
-            shim_dev.stop_streaming()
-           
-            
-            
+            stream(writer.handle_packet)
         finally:
-            print(f"\n✅ Data continuously saved to {DATA_FILE}.")
+            writer.stop()
+            print(f"\n✅ Data saved in blocks to {SESSION_FILE}.")
 
 
 # if __name__ == '__main__':
@@ -0,0 +1,54 @@
+"""
+Local IPC channel for live PPG stats.
+
+ppg.py publishes one small JSON datagram per summary interval (heart rate,
+samples/sec, packet gaps, ...) over UDP on localhost. UDP keeps the recorder
+independent of the reader: if nobody listens the datagram is simply dropped, and
+a slow reader can never block acquisition. run_experiment_gui.py polls a
+non-blocking StatsListener from the Tk event loop.
+"""
+
+import json
+import socket
+
+HOST = "127.0.0.1"
+PPG_STATS_PORT = 65433
+
+
+class StatsPublisher:
+    def __init__(self, host=HOST, port=PPG_STATS_PORT):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def publish(self, stats):
+        try:
+            self.sock.sendto(json.dumps(stats).encode("utf-8"), self.address)
+        except OSError:
+            pass  # no listener or a full socket buffer; the next update will follow
+
+    def close(self):
+        self.sock.close()
+
+
+class StatsListener:
+    def __init__(self, host=HOST, port=PPG_STATS_PORT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+    def poll(self):
+        """Return the newest stats dict received since the last call, or None. Never blocks."""
+        latest = None
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(65535)
+            except (BlockingIOError, ConnectionResetError):
+                return latest
+            try:
+                latest = json.loads(data.decode("utf-8"))
+            except ValueError:
+                continue
+
+    def close(self):
+        self.sock.close()
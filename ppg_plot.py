@@ -0,0 +1,175 @@
+"""
+Plotting for long PPG traces.
+
+A 30-minute recording at 512 Hz is close to a million samples, far more than an
+axis has pixels. DecimatedLine keeps the full arrays and only hands matplotlib
+the minimum and maximum of each pixel-wide bucket of the visible range, so the
+envelope (and every peak) looks the same as the full trace. When the view is
+zoomed or panned, the ``xlim_changed`` callback re-decimates the newly visible
+range at full detail.
+
+Usage:
+    $ python ppg_plot.py ./data/test/participant_test_ppg_data.csv     # interactive
+    $ python ppg_plot.py --export --root ./data --out-dir ./data/figures  # every participant, PNG
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from analyze_ppg import (
+    DATA_ROOT, FILTER_ORDER, HIGHCUT, LOWCUT, bandpass_filter, detect_clean_heartbeats,
+    discover, file_identity, load_ppg, recording_row, summarise_beats,
+)
+from epochs import load_markers, marker_path, wall_clock
+
+FIGURES_DIR = "./data/figures"
+FIGSIZE = (10, 5)
+DPI = 150
+MIN_BUCKETS = 64
+
+
+def minmax_decimate(x, y, x0, x1, buckets):
+    """(x, y) reduced to the min and max of ``buckets`` equal slices of the range [x0, x1].
+
+    ``x`` must be sorted. One point either side of the range is kept so the line
+    runs off the edges of the axis instead of stopping short.
+    """
+    lo = max(int(np.searchsorted(x, x0, side="left")) - 1, 0)
+    hi = min(int(np.searchsorted(x, x1, side="right")) + 1, len(x))
+    n = hi - lo
+    if n <= 2 * buckets:
+        return x[lo:hi], y[lo:hi]
+    size = n // buckets
+    usable = size * buckets
+    block = y[lo:lo + usable].reshape(buckets, size)
+    base = lo + np.arange(buckets) * size
+    first = base + block.argmin(axis=1)
+    second = base + block.argmax(axis=1)
+    # Keep each bucket's two points in time order, then append the leftover tail.
+    pairs = np.sort(np.stack((first, second), axis=1), axis=1).ravel()
+    index = np.concatenate((pairs, np.arange(lo + usable, hi)))
+    return x[index], y[index]
+
+
+class DecimatedLine:
+    """A Line2D showing a min/max-decimated view of (x, y) that follows zoom and pan."""
+
+    def __init__(self, ax, x, y, **kwargs):
+        self.ax = ax
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        (self.line,) = ax.plot(*self._decimate(self.x[0], self.x[-1]), **kwargs)
+        # The callback registry only holds bound methods weakly; a plain function is
+        # held strongly, and through it this object lives as long as the axes.
+        ax.callbacks.connect("xlim_changed", lambda ax: self._on_xlim(ax))
+
+    def _buckets(self):
+        width = self.ax.get_window_extent().width
+        return max(int(width), MIN_BUCKETS)
+
+    def _decimate(self, x0, x1):
+        return minmax_decimate(self.x, self.y, x0, x1, self._buckets())
+
+    def _on_xlim(self, ax):
+        self.line.set_data(*self._decimate(*ax.get_xlim()))
+
+
+def draw_markers(ax, path, time_axis):
+    """Vertical lines for the audio.py markers that fall inside the recording."""
+    if not os.path.exists(marker_path(path)) or len(time_axis) == 0:
+        return
+    markers = load_markers(marker_path(path))
+    offsets = markers["wall"].to_numpy() - wall_clock(path, time_axis[:1])[0]
+    inside = (offsets >= 0) & (offsets <= time_axis[-1])
+    top = ax.get_ylim()[1]
+    for x, label in zip(offsets[inside], markers["label"][inside]):
+        ax.axvline(x=x, color="g", linestyle="--", alpha=0.5)
+        ax.text(x, top, label, rotation=90, va="top", fontsize=7)
+
+
+def plot_recording(path, fig=None):
+    """Filtered PPG, detected beats and markers of one recording. Returns (figure, BPM)."""
+    import matplotlib.pyplot as plt
+
+    time_axis, ppg_signal, fs = load_ppg(path)
+    filtered_ppg = bandpass_filter(ppg_signal, LOWCUT, HIGHCUT, fs, FILTER_ORDER)
+    peaks, valid, quality = detect_clean_heartbeats(ppg_signal, filtered_ppg, fs)
+    hr = summarise_beats(recording_row(path, time_axis, fs), time_axis[peaks], valid)["hr_bpm"]
+
+    fig = fig or plt.figure(figsize=FIGSIZE)
+    ax = fig.add_subplot()
+    ax.set_xlim(time_axis[0], time_axis[-1])  # before the line, so it decimates at the final width
+    DecimatedLine(ax, time_axis, filtered_ppg, label="Filtered PPG Signal", color="blue")
+    ax.plot(time_axis[peaks], filtered_ppg[peaks], "ro", markersize=3, label="Detected Heartbeats")
+    for start in quality.loc[~quality["passed"], "time"]:
+        ax.axvspan(start, start + quality["length"].iloc[0] / fs, color="grey", alpha=0.2, linewidth=0)
+    draw_markers(ax, path, time_axis)
+    experiment, participant = file_identity(path)
+    title = "PPG Signal with Heart Rate Detection"
+    if hr is not None:
+        title += f" ({experiment} / {participant}: {hr:.1f} BPM)"
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("PPG Value (mV)")
+    ax.set_title(title)
+    ax.legend(loc="lower right")
+    ax.grid()
+    return fig, hr
+
+
+def show_recording(path):
+    import matplotlib.pyplot as plt
+
+    _, hr = plot_recording(path)
+    if hr is not None:
+        print(f"\n❤️ Estimated Heart Rate: {hr:.2f} BPM")
+    else:
+        print("\n⚠️ Not enough data to calculate heart rate.")
+    plt.show()
+
+
+def figure_path(path, out_dir=FIGURES_DIR):
+    experiment, participant = file_identity(path)
+    return os.path.join(out_dir, f"{experiment}_participant_{participant}_ppg.png")
+
+
+def export_png(path, out_dir=FIGURES_DIR):
+    """Render one recording to a PNG without a display; runs in a worker process."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    # A bare Figure is not tracked by pyplot, so nothing accumulates in the worker.
+    fig = Figure(figsize=FIGSIZE)
+    plot_recording(path, fig)
+    out = figure_path(path, out_dir)
+    fig.savefig(out, dpi=DPI)
+    return out
+
+
+def export_study(root=DATA_ROOT, out_dir=FIGURES_DIR, workers=None):
+    paths = discover(root)
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        written = list(pool.map(export_png, paths, [out_dir] * len(paths)))
+    print(f"✅ {len(written)} figures written to {out_dir}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot PPG recordings.")
+    parser.add_argument("file", nargs="?", help="recording to show interactively")
+    parser.add_argument("--export", action="store_true", help="render a PNG per recording under --root")
+    parser.add_argument("--root", default=DATA_ROOT)
+    parser.add_argument("--out-dir", default=FIGURES_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.export:
+        export_study(args.root, args.out_dir, args.workers)
+    elif args.file:
+        show_recording(args.file)
+    else:
+        parser.error("pass a recording to plot or --export")
@@ -0,0 +1,156 @@
+"""
+Windowed PPG signal-quality index (SQI).
+
+The recording is cut into fixed windows (a reshaped view, no copies) and every
+window gets four scores:
+    skewness       of the band-passed signal; clean pulses are asymmetric (> 0)
+    perfusion      pulse amplitude as % of the raw DC level; ~0 on dropouts
+    zcr            zero crossings per second; noise crosses far more often than
+                   a 0.5-3 Hz pulse
+    template_corr  mean correlation of the window's beats with the recording's
+                   average beat
+The first three need no beats and are computed for all windows at once.
+Peak detection then runs only on runs of windows that pass them, and the
+template correlation of the detected beats decides the final verdict. Beats in
+failing windows are dropped, and an interval only counts when both beats lie in
+the same run of passing windows.
+
+Usage:
+    quality = signal_quality(ppg, filtered, fs)
+    peaks, valid, quality = gated_peaks(filtered, fs, quality, detect_heartbeats)
+"""
+
+import numpy as np
+import pandas as pd
+
+SQI_WINDOW = 5.0  # s
+SKEW_MIN = 0.0
+PERFUSION_RANGE = (0.05, 50.0)  # % of the raw DC level
+AMPLITUDE_RANGE = (0.2, 5.0)  # x the recording's median window amplitude
+ZCR_RANGE = (0.5, 8.0)  # crossings per second
+TEMPLATE_MIN = 0.86
+
+
+def sqi_params():
+    """Thresholds that change the verdict; part of the analysis cache keys."""
+    return {
+        "window": SQI_WINDOW,
+        "skew_min": SKEW_MIN,
+        "perfusion": list(PERFUSION_RANGE),
+        "amplitude": list(AMPLITUDE_RANGE),
+        "zcr": list(ZCR_RANGE),
+        "template_min": TEMPLATE_MIN,
+    }
+
+
+def window_starts(n, length):
+    """Start index of every full window; a shorter tail belongs to the last window."""
+    length = max(min(length, n), 1)
+    return np.arange(0, max(n - length, 0) + 1, length), length
+
+
+def window_of(indices, n_windows, length):
+    """Window number of each sample index."""
+    return np.minimum(np.asarray(indices) // length, n_windows - 1)
+
+
+def signal_quality(raw, filtered, fs, window=SQI_WINDOW):
+    """Beat-free SQI scores per window. Returns a DataFrame with a ``passed`` column."""
+    filtered = np.asarray(filtered, dtype=np.float64)
+    raw = np.asarray(raw, dtype=np.float64)
+    starts, length = window_starts(len(filtered), int(round(window * fs)))
+    # The windows do not overlap, so a reshape of the covered samples is a view.
+    view = filtered[:len(starts) * length].reshape(len(starts), length)
+    raw_view = raw[:len(starts) * length].reshape(len(starts), length)
+
+    centred = view - view.mean(axis=1, keepdims=True)
+    m2 = np.mean(centred ** 2, axis=1)
+    m3 = np.mean(centred ** 3, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        skewness = np.where(m2 > 0, m3 / m2 ** 1.5, 0.0)
+    lo, hi = np.percentile(view, [5, 95], axis=1)
+    amplitude = hi - lo
+    dc = np.abs(np.median(raw_view, axis=1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        perfusion = np.where(dc > 0, 100.0 * amplitude / dc, 0.0)
+        relative = amplitude / np.median(amplitude)
+
+    crossings = np.signbit(filtered[1:]) != np.signbit(filtered[:-1])
+    counts = np.concatenate(([0], np.cumsum(crossings)))
+    zcr = (counts[starts + length - 1] - counts[starts]) / (length / fs)
+
+    passed = ((skewness > SKEW_MIN)
+              & (perfusion >= PERFUSION_RANGE[0]) & (perfusion <= PERFUSION_RANGE[1])
+              & (relative >= AMPLITUDE_RANGE[0]) & (relative <= AMPLITUDE_RANGE[1])
+              & (zcr >= ZCR_RANGE[0]) & (zcr <= ZCR_RANGE[1]))
+    return pd.DataFrame({
+        "start": starts,
+        "length": length,
+        "time": starts / fs,
+        "skewness": skewness,
+        "perfusion": perfusion,
+        "amplitude": relative,
+        "zcr": zcr,
+        "template_corr": np.nan,
+        "passed": passed,
+    })
+
+
+def runs(mask):
+    """[first, last) index pairs of the runs of True in a bool array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def template_correlation(filtered, peaks, fs):
+    """Pearson correlation of each beat with the mean beat, NaN for beats too close to the edges."""
+    corr = np.full(len(peaks), np.nan)
+    if len(peaks) < 3:
+        return corr
+    span = int(np.median(np.diff(peaks)))
+    before, after = span // 3, span - span // 3
+    inside = (peaks - before >= 0) & (peaks + after <= len(filtered))
+    if inside.sum() < 2:
+        return corr
+    segments = filtered[peaks[inside, None] + np.arange(-before, after)]
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    template = segments.mean(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr[inside] = (segments @ template) / (np.linalg.norm(segments, axis=1) * np.linalg.norm(template))
+    return corr
+
+
+def gated_peaks(filtered, fs, quality, detect):
+    """Run ``detect(segment, fs)`` on passing windows only and apply the template check.
+
+    Returns (peak indices, per-interval ``valid`` mask for hrv.beat_intervals, and
+    ``quality`` with template_corr filled in and ``passed`` updated).
+    """
+    quality = quality.copy()
+    length = int(quality["length"].iloc[0]) if len(quality) else 1
+    starts = quality["start"].to_numpy()
+    n_windows = len(starts)
+    bounds = np.append(starts, len(filtered))
+
+    found = []
+    for first, last in zip(*runs(quality["passed"].to_numpy())):
+        lo, hi = bounds[first], bounds[last]
+        found.append(np.asarray(detect(filtered[lo:hi], fs)) + lo)
+    peaks = np.concatenate(found).astype(np.int64) if found else np.zeros(0, dtype=np.int64)
+
+    windows = window_of(peaks, n_windows, length)
+    corr = template_correlation(filtered, peaks, fs)
+    with np.errstate(invalid="ignore"):
+        total = np.bincount(windows[~np.isnan(corr)], corr[~np.isnan(corr)], minlength=n_windows)
+        count = np.bincount(windows[~np.isnan(corr)], minlength=n_windows)
+        window_corr = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    quality["template_corr"] = window_corr
+    quality["passed"] = quality["passed"].to_numpy() & (count >= 2) & (window_corr >= TEMPLATE_MIN)
+
+    passed = quality["passed"].to_numpy()
+    keep = passed[windows] if len(peaks) else np.zeros(0, dtype=bool)
+    peaks, windows = peaks[keep], windows[keep]
+    # Both beats passed; the interval is valid unless a failing window lies between them.
+    run_id = np.cumsum(~passed)
+    valid = run_id[windows[1:]] == run_id[windows[:-1]]
+    return peaks, valid, quality
@@ -0,0 +1,162 @@
+"""
+Fixed-width binary session files for PPG recordings.
+
+Layout:
+    8 bytes   magic ``b"PPGSESS1"``
+    4 bytes   little-endian length of the JSON header
+    N bytes   UTF-8 JSON header, zero padded so records start on a 4096-byte boundary
+    ...       fixed-width records, one NumPy structured row per sample
+
+The header describes the record dtype, the column to search on (``time_field``),
+the sampling rate, the channel list, the participant / experiment ids and the
+clock base captured when the recording started. The record count is never
+stored; it is derived from the file size, so a session that was killed
+mid-recording is still readable up to the last complete record.
+
+Usage:
+    reader = SessionReader("./data/test/participant_test_ppg_session.bin")
+    window = reader.slice(60.0, 120.0)   # memmap view, nothing else is read
+    ppg = window["ppg"]
+    wall = reader.wall_time(window["host_ns"])   # Unix seconds, comparable to audio.py logs
+"""
+
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"PPGSESS1"
+HEADER_ALIGN = 4096
+FORMAT_VERSION = 1
+
+
+def _descr(dtype):
+    return [[name, dtype.fields[name][0].str] for name in dtype.names]
+
+
+class SessionWriter:
+    """Append-only writer for a session file.
+
+    Args:
+        path (str): Output file, truncated on open.
+        dtype (np.dtype): Structured record dtype.
+        time_field (str): Non-decreasing column that readers binary-search on.
+        **metadata: Extra header fields (sampling_rate, channels, participant_id, ...).
+    """
+
+    def __init__(self, path, dtype, time_field, **metadata):
+        self.dtype = np.dtype(dtype)
+        if time_field not in self.dtype.names:
+            raise ValueError(f"time_field '{time_field}' is not a column of {self.dtype}")
+        self.path = path
+        self.header = {
+            "version": FORMAT_VERSION,
+            "dtype": _descr(self.dtype),
+            "time_field": time_field,
+            "clock_base": {"monotonic_ns": time.monotonic_ns(), "wall_ns": time.time_ns()},
+        }
+        self.header.update(metadata)
+        self.count = 0
+        self._file = open(path, "wb")
+        self._file.write(_encode_header(self.header))
+        self._file.flush()
+
+    def append(self, records):
+        records = np.asarray(records, dtype=self.dtype)
+        self._file.write(records.tobytes())
+        self.count += len(records)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _encode_header(header):
+    payload = json.dumps(header).encode("utf-8")
+    size = len(MAGIC) + 4 + len(payload)
+    padded = -(-size // HEADER_ALIGN) * HEADER_ALIGN
+    return MAGIC + struct.pack("<I", len(payload)) + payload + b"\0" * (padded - size)
+
+
+def read_header(path):
+    """Return (header dict, byte offset of the first record)."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a PPG session file")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode("utf-8"))
+    size = len(MAGIC) + 4 + length
+    return header, -(-size // HEADER_ALIGN) * HEADER_ALIGN
+
+
+class SessionReader:
+    """Random-access reader exposing the records of a session file as an ``np.memmap``.
+
+    Opening a session only reads the header; slicing by time binary-searches the
+    time column, so only the pages touched by the search and the slice are read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header, self.offset = read_header(path)
+        self.dtype = np.dtype([tuple(field) for field in self.header["dtype"]])
+        self.time_field = self.header["time_field"]
+        count = max(os.path.getsize(path) - self.offset, 0) // self.dtype.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=self.offset, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def sampling_rate(self):
+        return self.header.get("sampling_rate")
+
+    @property
+    def channels(self):
+        return self.header.get("channels", [])
+
+    @property
+    def times(self):
+        return self.records[self.time_field]
+
+    def index_range(self, t0=None, t1=None, field=None):
+        """Return the [start, stop) record indices covering times ``t0 <= t <= t1``.
+
+        ``field`` picks another non-decreasing column to search (e.g. ``host_ns``).
+        """
+        times = self.times if field is None else self.records[field]
+        start = 0 if t0 is None else int(np.searchsorted(times, t0, side="left"))
+        stop = len(times) if t1 is None else int(np.searchsorted(times, t1, side="right"))
+        return start, max(start, stop)
+
+    def slice(self, t0=None, t1=None, field=None):
+        start, stop = self.index_range(t0, t1, field)
+        return self.records[start:stop]
+
+    def channel(self, name, t0=None, t1=None):
+        return self.slice(t0, t1)[name]
+
+    def wall_time(self, host_ns):
+        """Convert host monotonic ns (the ``host_ns`` column) to Unix epoch seconds."""
+        base = self.header["clock_base"]
+        return (np.asarray(host_ns, dtype=np.int64) - base["monotonic_ns"] + base["wall_ns"]) * 1e-9
+
+    def wall_to_host_ns(self, wall_seconds):
+        """Inverse of wall_time, for slicing on ``host_ns`` with wall-clock marker times."""
+        base = self.header["clock_base"]
+        wall_ns = np.round(np.asarray(wall_seconds, dtype=np.float64) * 1e9).astype(np.int64)
+        return wall_ns - base["wall_ns"] + base["monotonic_ns"]
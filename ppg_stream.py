@@ -0,0 +1,404 @@
+"""
+Buffered acquisition path for the Shimmer PPG stream.
+
+The stream callback only copies each packet into a preallocated NumPy ring
+buffer. A background thread drains the buffer to disk in blocks and prints a
+once-per-second summary instead of one console line per packet. Blocks are
+written in the session format from ppg_session.py.
+
+Device ticks are unwrapped and mapped onto the host ``time.monotonic_ns()`` clock
+as blocks are drained (see ClockSync), so every record carries both an unwrapped
+device time and a host time that lines up with the wall-clock logs.
+
+The channels recorded are picked from CHANNEL_SETS; each packet becomes one row
+of a structured dtype with one field per channel. The main ``ppg`` channel of
+every drained block is also fed to hr_engine.StreamingHeartRate, so the summary
+line shows live heart rate. Each summary can also be published to the GUI over
+ppg_ipc.StatsPublisher, and AcquisitionStats keeps packet-rate, gap and latency
+counters that are written to a JSON stats file next to the data.
+"""
+
+import json
+import os
+import threading
+import time
+from operator import itemgetter
+
+import numpy as np
+from pyshimmer import DataPacket, EChannelType
+from pyshimmer.dev.channels import ChDataTypeAssignment, ESensorGroup
+
+from hr_engine import StreamingHeartRate
+from ppg_session import SessionWriter
+
+DEVICE_CLOCK_HZ = 32768.0
+TICK_WRAP = 2 ** (8 * ChDataTypeAssignment[EChannelType.TIMESTAMP].size)
+
+# "sensors" is passed to set_sensors() (None keeps the device configuration);
+# "channels" maps record field names to packet channels, main PPG site first.
+CHANNEL_SETS = {
+    "ppg": {
+        "sensors": None,
+        "channels": {"ppg": EChannelType.INTERNAL_ADC_13},
+    },
+    "ppg3_ecg": {
+        "sensors": [ESensorGroup.CH_A12, ESensorGroup.CH_A13, ESensorGroup.CH_A14, ESensorGroup.EXG1_16BIT],
+        "channels": {
+            "ppg": EChannelType.INTERNAL_ADC_13,
+            "ppg_a12": EChannelType.INTERNAL_ADC_12,
+            "ppg_a14": EChannelType.INTERNAL_ADC_14,
+            "ecg": EChannelType.EXG_ADS1292R_1_CH1_16BIT,
+        },
+    },
+}
+
+
+def ring_dtype(channel_names):
+    """What the stream callback stores per packet: raw ticks, channels, host receive time."""
+    return np.dtype([("ticks", "<i8")] + [(name, "<f8") for name in channel_names] + [("host_ns", "<i8")])
+
+
+def record_dtype(channel_names):
+    """What ends up on disk: unwrapped device time, fitted host time, channels."""
+    return np.dtype([("device_time", "<f8"), ("host_ns", "<i8")] + [(name, "<f8") for name in channel_names])
+
+
+RING_DTYPE = ring_dtype(["ppg"])
+RECORD_DTYPE = record_dtype(["ppg"])
+
+
+class ClockSync:
+    """Incremental device-clock unwrapping and device-to-host clock alignment.
+
+    Raw ``EChannelType.TIMESTAMP`` values are 24-bit ticks of a 32768 Hz clock and
+    wrap every 512 s. Each block is unwrapped against the last tick of the previous
+    block, then a running least-squares line ``host = slope * device + intercept``
+    is updated with the block (co-moments are merged per block, so the fit stays
+    numerically stable for hours) and used to map the block onto the host clock.
+    The fitted host time averages out Bluetooth delivery jitter.
+    """
+
+    def __init__(self, clock_hz=DEVICE_CLOCK_HZ, wrap=TICK_WRAP):
+        self.clock_hz = clock_hz
+        self.wrap = wrap
+        self.offset = 0
+        self.last_tick = None
+        self.x0 = None  # device seconds origin
+        self.y0 = None  # host ns origin
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.cxx = 0.0
+        self.cxy = 0.0
+
+    def unwrap(self, ticks):
+        ticks = np.asarray(ticks, dtype=np.int64)
+        prev = ticks[0] if self.last_tick is None else self.last_tick
+        wraps = np.cumsum(np.diff(ticks, prepend=prev) < 0)
+        unwrapped = ticks + (self.offset + wraps * self.wrap)
+        self.offset += int(wraps[-1]) * self.wrap
+        self.last_tick = int(ticks[-1])
+        return unwrapped
+
+    @property
+    def slope(self):
+        return self.cxy / self.cxx if self.n > 1 and self.cxx > 0 else 1.0
+
+    @property
+    def drift_ppm(self):
+        return (self.slope - 1.0) * 1e6
+
+    def update(self, device_time, host_ns):
+        if self.x0 is None:
+            self.x0 = float(device_time[0])
+            self.y0 = int(host_ns[0])
+        x = device_time - self.x0
+        y = (host_ns - self.y0) * 1e-9
+        nb = len(x)
+        mx, my = x.mean(), y.mean()
+        dx, dy = mx - self.mean_x, my - self.mean_y
+        n = self.n + nb
+        self.cxx += ((x - mx) ** 2).sum() + dx * dx * self.n * nb / n
+        self.cxy += ((x - mx) * (y - my)).sum() + dx * dy * self.n * nb / n
+        self.mean_x += dx * nb / n
+        self.mean_y += dy * nb / n
+        self.n = n
+
+    def to_host_ns(self, device_time):
+        y = self.mean_y + self.slope * (device_time - self.x0 - self.mean_x)
+        return self.y0 + np.round(y * 1e9).astype(np.int64)
+
+    def process(self, ticks, host_ns):
+        """Return (unwrapped device seconds, fitted host monotonic ns) for one block."""
+        device_time = self.unwrap(ticks) / self.clock_hz
+        self.update(device_time, host_ns)
+        return device_time, self.to_host_ns(device_time)
+
+
+class PacketRingBuffer:
+    """Preallocated single-producer / single-consumer ring of fixed-width records.
+
+    The stream callback is the only writer of ``head`` and the drain thread is the
+    only writer of ``tail``, so no lock is needed on the hot path. When the ring is
+    full the newest record is dropped and counted instead of blocking the reader.
+    """
+
+    def __init__(self, capacity, dtype=RING_DTYPE):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=dtype)
+        self.head = 0  # total records pushed
+        self.tail = 0  # total records drained
+        self.dropped = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def push(self, row):
+        head = self.head
+        if head - self.tail >= self.capacity:
+            self.dropped += 1
+            return False
+        self.data[head % self.capacity] = row
+        self.head = head + 1
+        return True
+
+    def drain(self):
+        """Return a contiguous copy of every pending record and release its slots."""
+        head = self.head
+        count = head - self.tail
+        start = self.tail % self.capacity
+        if start + count <= self.capacity:
+            block = self.data[start:start + count].copy()
+        else:
+            block = np.concatenate((self.data[start:], self.data[:start + count - self.capacity]))
+        self.tail = head
+        return block
+
+
+class AcquisitionStats:
+    """Health counters for the acquisition path.
+
+    Tracks packets received, packets without the requested channels, timestamp gaps
+    longer than 1.5x the nominal sample period (and the samples they cost), a log2
+    histogram of stream-callback latency and a log2 histogram of receipt-to-disk
+    latency. Bin ``b`` of a histogram counts durations in ``[2**(b-1), 2**b)`` ns.
+    """
+
+    BINS = 40
+
+    def __init__(self, sampling_rate):
+        self.sampling_rate = sampling_rate
+        self.nominal_period = 1.0 / sampling_rate
+        self.started = time.time()
+        self.packets = 0
+        self.missing = 0
+        self.gaps = 0
+        self.lost_samples = 0
+        self.longest_gap = 0.0
+        self.handler_hist = [0] * self.BINS
+        self.write_hist = [0] * self.BINS
+        self._last_device_time = None
+
+    def observe_block(self, device_time, host_ns):
+        """Update gap counters and write latency from one block that just hit the disk."""
+        prev = device_time[0] if self._last_device_time is None else self._last_device_time
+        steps = np.diff(device_time, prepend=prev)
+        gaps = steps[steps > 1.5 * self.nominal_period]
+        if len(gaps):
+            self.gaps += len(gaps)
+            self.lost_samples += int(np.round(gaps / self.nominal_period).sum()) - len(gaps)
+            self.longest_gap = max(self.longest_gap, float(gaps.max()))
+        self._last_device_time = device_time[-1]
+        latency = np.maximum(time.monotonic_ns() - host_ns, 1)
+        bins = np.minimum(np.frexp(latency.astype(np.float64))[1], self.BINS - 1)
+        for b, count in zip(*np.unique(bins, return_counts=True)):
+            self.write_hist[b] += int(count)
+
+    @staticmethod
+    def percentile_ns(hist, q):
+        """Upper bin edge below which a fraction ``q`` of the histogram lies."""
+        total = sum(hist)
+        if total == 0:
+            return None
+        running = 0
+        for b, count in enumerate(hist):
+            running += count
+            if running >= q * total:
+                return 2 ** b
+        return 2 ** (len(hist) - 1)
+
+    def to_dict(self, dropped=0):
+        return {
+            "sampling_rate": self.sampling_rate,
+            "started": self.started,
+            "updated": time.time(),
+            "packets": self.packets,
+            "missing": self.missing,
+            "dropped": dropped,
+            "gaps": self.gaps,
+            "lost_samples": self.lost_samples,
+            "longest_gap_s": self.longest_gap,
+            "handler_latency_ns": {
+                "p50": self.percentile_ns(self.handler_hist, 0.5),
+                "p99": self.percentile_ns(self.handler_hist, 0.99),
+                "max": self.percentile_ns(self.handler_hist, 1.0),
+                "log2_histogram": self.handler_hist,
+            },
+            "write_latency_ns": {
+                "p50": self.percentile_ns(self.write_hist, 0.5),
+                "p99": self.percentile_ns(self.write_hist, 0.99),
+                "max": self.percentile_ns(self.write_hist, 1.0),
+                "log2_histogram": self.write_hist,
+            },
+        }
+
+    def write(self, path, dropped=0):
+        """Atomically replace the machine-readable stats file."""
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(dropped), f, indent=2)
+        os.replace(tmp, path)
+
+
+class BufferedPPGWriter:
+    """Ring-buffered replacement for the per-packet CSV writer in ppg.py.
+
+    Args:
+        path (str): Output session file (see ppg_session.py).
+        sampling_rate (float): Device sampling rate, stored in the session header.
+        participant_id (str): Stored in the session header.
+        experiment_id (str): Stored in the session header.
+        channel_set (str): Key of CHANNEL_SETS to record.
+        heart_rate (bool): Run the streaming heart-rate engine on the ``ppg`` channel.
+        publisher: Optional object with ``publish(dict)`` that receives every summary.
+        stats_path (str): Optional JSON file rewritten with AcquisitionStats every summary.
+        capacity (int): Ring buffer size in records.
+        flush_interval (float): Seconds between block writes.
+        summary_interval (float): Seconds between console summary lines.
+    """
+
+    def __init__(self, path, sampling_rate, participant_id, experiment_id, channel_set="ppg",
+                 heart_rate=True, publisher=None, stats_path=None, capacity=512 * 30,
+                 flush_interval=0.5, summary_interval=1.0):
+        self.path = path
+        self.sampling_rate = sampling_rate
+        self.participant_id = participant_id
+        self.experiment_id = experiment_id
+        channels = CHANNEL_SETS[channel_set]["channels"]
+        self.channel_names = list(channels)
+        self.record_dtype = record_dtype(self.channel_names)
+        # One C-level call pulls the timestamp and every channel out of a packet.
+        self._read_packet = itemgetter(EChannelType.TIMESTAMP, *channels.values())
+        self.buffer = PacketRingBuffer(capacity, ring_dtype(self.channel_names))
+        self.clock = ClockSync()
+        self.stats = AcquisitionStats(sampling_rate)
+        self.heart_rate = StreamingHeartRate(sampling_rate) if heart_rate else None
+        self.publisher = publisher
+        self.stats_path = stats_path
+        self.latest = {}
+        self.flush_interval = flush_interval
+        self.summary_interval = summary_interval
+        self.written = 0
+        self._file = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._period_samples = 0
+        self._last = None
+
+    def handle_packet(self, pkt: DataPacket) -> None:
+        """Stream callback: copy (ticks, channels..., host time) into the ring buffer and return."""
+        received = time.perf_counter_ns()
+        stats = self.stats
+        try:
+            row = self._read_packet(pkt) + (time.monotonic_ns(),)
+        except KeyError:
+            stats.missing += 1
+            return
+        self.buffer.push(row)
+        stats.packets += 1
+        # Inlined rather than a method call: this runs 512 times a second.
+        stats.handler_hist[min((time.perf_counter_ns() - received).bit_length(), AcquisitionStats.BINS - 1)] += 1
+
+    def start(self):
+        self._file = SessionWriter(self.path, self.record_dtype, "device_time",
+                                   sampling_rate=self.sampling_rate,
+                                   device_clock_hz=self.clock.clock_hz,
+                                   channels=self.channel_names,
+                                   participant_id=self.participant_id,
+                                   experiment_id=self.experiment_id)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ppg-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the drain thread and write out everything still in the buffer."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+        if self.stats_path is not None:
+            self.stats.write(self.stats_path, self.buffer.dropped)
+
+    def flush(self):
+        raw = self.buffer.drain()
+        if len(raw) == 0:
+            return 0
+        block = np.empty(len(raw), dtype=self.record_dtype)
+        block["device_time"], block["host_ns"] = self.clock.process(raw["ticks"], raw["host_ns"])
+        for name in self.channel_names:
+            block[name] = raw[name]
+        self._file.append(block)
+        self._file.flush()
+        self.stats.observe_block(block["device_time"], raw["host_ns"])
+        if self.heart_rate is not None:
+            self.heart_rate.process(block["device_time"], block["ppg"])
+        self.written += len(block)
+        self._period_samples += len(block)
+        self._last = block[-1]
+        return len(block)
+
+    def summary(self, elapsed):
+        rate = self._period_samples / elapsed if elapsed > 0 else 0.0
+        self._period_samples = 0
+        stats = self.stats
+        handler_p99 = stats.percentile_ns(stats.handler_hist, 0.99)
+        write_p99 = stats.percentile_ns(stats.write_hist, 0.99)
+        self.latest = {
+            "time": time.time(),
+            "samples_per_sec": rate,
+            "gaps": stats.gaps,
+            "lost_samples": stats.lost_samples,
+            "dropped": self.buffer.dropped,
+            "missing": stats.missing,
+            "handler_p99_us": handler_p99 / 1e3 if handler_p99 else None,
+            "write_p99_ms": write_p99 / 1e6 if write_p99 else None,
+        }
+        if self.heart_rate is not None:
+            self.latest.update(self.heart_rate.publish())
+        if self._last is None:
+            return f"[ppg] waiting for data | missing {stats.missing}"
+        bpm = self.latest.get("bpm")
+        hr = f"HR {bpm:.0f} BPM" if bpm is not None else "HR --"
+        handler = f"{handler_p99 / 1e3:.0f} us" if handler_p99 else "--"
+        write = f"{write_p99 / 1e6:.0f} ms" if write_p99 else "--"
+        return (f"[ppg] {rate:.0f} samples/s | {hr} | Device time: {self._last['device_time']:.2f} s | "
+                f"PPG: {self._last['ppg']:.0f} | drift {self.clock.drift_ppm:+.0f} ppm | "
+                f"gaps {stats.gaps} (lost {stats.lost_samples}) | dropped {self.buffer.dropped} | "
+                f"missing {stats.missing} | handler p99 < {handler} | write p99 < {write}")
+
+    def _run(self):
+        last_summary = time.monotonic()
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            now = time.monotonic()
+            if now - last_summary >= self.summary_interval:
+                print(self.summary(now - last_summary), flush=True)
+                if self.publisher is not None:
+                    self.publisher.publish(self.latest)
+                if self.stats_path is not None:
+                    self.stats.write(self.stats_path, self.buffer.dropped)
+                last_summary = now
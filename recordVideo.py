@@ -5,6 +5,8 @@ import os
 import socket
 import threading
 
+from video_index import ShowinfoIndexer, ffmpeg_index_args, index_path
+
 HOST = '127.0.0.1'
 PORT = 65431  # You can choose any free port
 
@@ -15,6 +17,7 @@ output_dir = f"./data/{experiment_id}/"
 os.makedirs(output_dir, exist_ok=True)
 video_filename = os.path.join(output_dir, f"participant_{participant_id}_video.mp4")
 log_filename = os.path.join(output_dir, f"ffmpeg_{participant_id}.log")
+index_filename = index_path(video_filename)
 
 
 ffmpeg_cmd = [
@@ -26,6 +29,7 @@ ffmpeg_cmd = [
     '-preset', 'veryfast',
     # '-vf', 'scale=640:360',
     '-crf', '23',
+    *ffmpeg_index_args(),  # per-frame showinfo lines on stderr + fixed GOP, for the frame index
     '-f', 'mp4',
     '-y',
     video_filename
@@ -51,9 +55,29 @@ def socket_server():
                 except Exception as e:
                     print(f"Error stopping FFmpeg: {e}")
 
+def stderr_reader(stream, log, indexer):
+    """Copy FFmpeg's stderr to the log file and feed the showinfo lines to the frame index.
+
+    The pipe must keep draining whatever happens: if this thread died, FFmpeg would
+    block as soon as stderr filled up and the recording would stall.
+    """
+    warned = False
+    for line in stream:
+        log.write(line)
+        try:
+            indexer.feed(line)
+        except Exception as e:
+            if not warned:
+                print(f"Warning: frame index stopped updating ({e}); the recording continues")
+                warned = True
+    log.flush()
+
 print(f"Starting FFmpeg recording... Output: {video_filename}")
 process = None
 log_file = None
+indexer = ShowinfoIndexer(index_filename, video_filename, participant_id=participant_id,
+                          experiment_id=experiment_id)
+reader_thread = None
 
 try:
     log_file = open(log_filename, 'w')
@@ -61,10 +85,15 @@ try:
         ffmpeg_cmd,
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
-        stderr=log_file,
+        stderr=subprocess.PIPE,
         text=True,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1,
         creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
     )
+    reader_thread = threading.Thread(target=stderr_reader, args=(process.stderr, log_file, indexer), daemon=True)
+    reader_thread.start()
 
     # Start IPC server in a separate thread
     threading.Thread(target=socket_server, daemon=True).start()
@@ -78,8 +107,12 @@ except Exception as e:
 finally:
     if process and process.poll() is None:
         process.terminate()
+    if reader_thread:
+        reader_thread.join(timeout=5)
+    indexer.close()
     if log_file:
         log_file.close()
 
     print(f"Recording finalized: {video_filename}")
     print(f"FFmpeg logs saved to: {log_filename}")
+    print(f"Frame index ({indexer.frames} frames) saved to: {index_filename}")
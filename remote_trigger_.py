@@ -21,7 +21,7 @@ an intensity value (0-100).
 from time import sleep
 from haptics_motor_control import activate_discrete, player
 
-from haptics_pattern_player import load_and_play_tact_file
+from haptics_pattern_player import load_and_play_tact_file, preload_patterns
 
 # Play a .tact file pattern
 
@@ -38,13 +38,29 @@ PORT = 65432      # Choose an appropriate port that is open on your firewall
 
 
 # Alternating Pattern (4 time steps)
-import time
 
+# trigger event -> (tact file, longest the pattern may take to finish, in seconds)
+TRIGGER_PATTERNS = {
+    "inhale": ("inhale.tact", 4),
+    "exhale": ("exhale.tact", 8),
+    "left_shoulder": ("left_shoulder2.tact", 8),
+    "left_abdomen": ("left_abdomen2.tact", 9),
+    "right_shoulder": ("right_shoulder2.tact", 8),
+    "right_abdomen": ("right_abdomen2.tact", 9),
+    "left_chest": ("left_chest2.tact", 9),
+    "right_chest": ("right_chest2.tact", 9),
+    "left_lower_back": ("left_lower_back2.tact", 8),
+    "right_lower_back": ("right_lower_back2.tact", 8),
+}
 
 
 
 if __name__ == "__main__":
     try:
+        # Register every pattern once, so a trigger only has to send a Submit.
+        registered = preload_patterns({event: tact_file for event, (tact_file, _) in TRIGGER_PATTERNS.items()})
+        print(f"Registered {registered} haptic patterns.")
+
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
             server_socket.bind((HOST, PORT))
             server_socket.listen()
@@ -68,46 +84,11 @@ if __name__ == "__main__":
                                 trigger_event = data.decode().strip()
                                 print(f"Received trigger: {trigger_event}")
 
-                                if trigger_event == "inhale":
-                                    print("Running wave pattern...")
-                                    load_and_play_tact_file("inhale", "inhale.tact")
-                                    time.sleep(4)
-                                elif trigger_event == "exhale":
-                                    print("Running wave pattern...")
-                                    load_and_play_tact_file("exhale", "exhale.tact")
-                                    time.sleep(8)
-                                elif trigger_event == "left_shoulder":
-                                    print("Running left shoulder pattern...")
-                                    load_and_play_tact_file("left_shoulder", "left_shoulder2.tact")
-                                    time.sleep(8)
-                                elif trigger_event == "left_abdomen":
-                                    print("Running left abdomen pattern...")
-                                    load_and_play_tact_file("left_abdomen", "left_abdomen2.tact")
-                                    time.sleep(9)
-                                elif trigger_event == "right_shoulder":
-                                    print("Running right shoulder pattern...")
-                                    load_and_play_tact_file("right_shoulder", "right_shoulder2.tact")
-                                    time.sleep(8)
-                                elif trigger_event == "right_abdomen":
-                                    print("Running right abdomen pattern...")
-                                    load_and_play_tact_file("right_abdomen", "right_abdomen2.tact")
-                                    time.sleep(9)
-                                elif trigger_event == "left_chest":
-                                    print("Running left chest pattern...")
-                                    load_and_play_tact_file("left_chest", "left_chest2.tact")
-                                    time.sleep(9)
-                                elif trigger_event == "right_chest":
-                                    print("Running right chest pattern...")
-                                    load_and_play_tact_file("right_chest", "right_chest2.tact")
-                                    time.sleep(9)
-                                elif trigger_event == "left_lower_back":
-                                    print("Running left lower back pattern...")
-                                    load_and_play_tact_file("left_lower_back", "left_lower_back2.tact")
-                                    time.sleep(8)
-                                elif trigger_event == "right_lower_back":
-                                    print("Running right lower back pattern...")
-                                    load_and_play_tact_file("right_lower_back", "right_lower_back2.tact")
-                                    time.sleep(8)
+                                if trigger_event in TRIGGER_PATTERNS:
+                                    tact_file, duration = TRIGGER_PATTERNS[trigger_event]
+                                    print(f"Running {trigger_event.replace('_', ' ')} pattern...")
+                                    # Returns as soon as the player reports the pattern finished
+                                    load_and_play_tact_file(trigger_event, tact_file, wait=duration)
                                 else:
                                     print("Invalid trigger:", trigger_event)
                             except socket.timeout:
@@ -1,17 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+import signal
 import subprocess
 import threading
 import time
 import socket
 import os
 from datetime import datetime
+from ppg_ipc import StatsListener
 
 # ---- CONFIG ----
 BREAK_DURATION = 15  # seconds
 MEDITATION_DURATION = 330  # seconds
 VIDEO_STOP_PORT = 65431
 PARTICIPANTS_FILE = "participants.txt"
+PHYSIO_POLL_MS = 500  # how often the live PPG readout is refreshed
+PHYSIO_STALE_AFTER = 3  # seconds without a PPG update before the readout is flagged
+STOP_TIMEOUT = 10  # seconds a process gets to shut down after CTRL_BREAK before it is terminated
 
 PRIMARY_COLOR = "#e0f7fa"  # light cyan
 ACCENT_COLOR = "#0288d1"   # blue
@@ -29,6 +34,8 @@ class ExperimentApp:
         self.experiment_id = tk.StringVar()
         self.processes = {}
         self.logs = {}
+        self.physio = None
+        self.physio_last_update = None
         self.experiment = "test"
 
         self.build_start_screen()
@@ -127,6 +134,40 @@ class ExperimentApp:
         style.configure("TProgressbar", foreground=ACCENT_COLOR, background=ACCENT_COLOR)
         self.progress.pack(pady=10)
 
+        physio_frame = tk.Frame(frame, bg=PRIMARY_COLOR)
+        physio_frame.pack(pady=20)
+        self.hr_label = tk.Label(physio_frame, text="HR: -- BPM", font=FONT, bg=PRIMARY_COLOR)
+        self.hr_label.grid(row=0, column=0, padx=15)
+        self.rate_label = tk.Label(physio_frame, text="Samples/s: --", font=FONT, bg=PRIMARY_COLOR)
+        self.rate_label.grid(row=0, column=1, padx=15)
+        self.gaps_label = tk.Label(physio_frame, text="Packet gaps: --", font=FONT, bg=PRIMARY_COLOR)
+        self.gaps_label.grid(row=0, column=2, padx=15)
+
+        try:
+            self.physio = StatsListener()
+        except OSError as e:
+            print(f"Live PPG readout unavailable: {e}")
+            self.physio = None
+        self.root.after(PHYSIO_POLL_MS, self.update_physio)
+
+    def update_physio(self):
+        """Refresh the live PPG readout from ppg.py without blocking the Tk event loop."""
+        if self.physio is None:
+            return
+        stats = self.physio.poll()
+        now = time.time()
+        if stats is not None:
+            self.physio_last_update = now
+            bpm = stats.get("bpm")
+            self.hr_label.config(text=f"HR: {bpm:.0f} BPM" if bpm is not None else "HR: -- BPM", fg="black")
+            self.rate_label.config(text=f"Samples/s: {stats.get('samples_per_sec', 0):.0f}", fg="black")
+            self.gaps_label.config(text=f"Packet gaps: {stats.get('gaps', 0)}", fg="black")
+        elif self.physio_last_update is not None and now - self.physio_last_update > PHYSIO_STALE_AFTER:
+            self.hr_label.config(text="HR: no PPG data", fg="red")
+            self.rate_label.config(fg="red")
+            self.gaps_label.config(fg="red")
+        self.root.after(PHYSIO_POLL_MS, self.update_physio)
+
     def log(self, message):
         self.status_label.config(text=message)
         print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
@@ -220,11 +261,33 @@ class ExperimentApp:
             self.log(f"Video stop failed: {e}")
 
         for key in ["qtrobot", "ppg"]:
-            proc = self.processes.get(key)
-            if proc and proc.poll() is None:
-                proc.terminate()
-                self.log(f"{key} process terminated.")
-    
+            self.stop_process(key)
+
+    def stop_process(self, key):
+        """Stop a child with CTRL_BREAK_EVENT like run_experiment.py, so ppg.py drains its buffer
+        and writes its stats; terminate() only if it is still running after STOP_TIMEOUT."""
+        proc = self.processes.get(key)
+        if not proc or proc.poll() is not None:
+            return
+        try:
+            proc.send_signal(signal.CTRL_BREAK_EVENT)
+            proc.wait(timeout=STOP_TIMEOUT)
+            self.log(f"{key} process stopped gracefully.")
+            return
+        except subprocess.TimeoutExpired:
+            self.log(f"{key} process did not stop within {STOP_TIMEOUT} s, terminating.")
+        except Exception as e:
+            self.log(f"Failed to stop {key}: {e}")
+        try:
+            proc.terminate()
+            proc.wait(timeout=3)
+            self.log(f"{key} process terminated.")
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            self.log(f"{key} process force-killed.")
+        except Exception as e:
+            self.log(f"Failed to terminate {key}: {e}")
+
     def stop_remote_qtrobot(self):
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -240,17 +303,11 @@ class ExperimentApp:
         self.log("Closing application... Terminating all processes.")
         self.stop_video()
         self.stop_remote_qtrobot()
-        for key, proc in self.processes.items():
-            if proc and proc.poll() is None:
-                try:
-                    proc.terminate()
-                    proc.wait(timeout=3)
-                    self.log(f"{key} process terminated.")
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-                    self.log(f"{key} process force-killed.")
-                except Exception as e:
-                    self.log(f"Failed to terminate {key}: {e}")
+        if self.physio is not None:
+            self.physio.close()
+            self.physio = None
+        for key in self.processes:
+            self.stop_process(key)
         self.root.destroy()
 
 
@@ -0,0 +1,281 @@
+"""
+One compressed, lazily loaded bundle per recording session.
+
+A session's files are scattered over ``data/{experiment}/``: the PPG recording,
+the marker log (audio.py, or the robot CSV fetched by download_data.ps1), the
+Stroop results before and after, the video with its frame index and feature
+columns, and a handful of logs. build_bundle packs every tabular stream into
+``participant_{id}_bundle.npz`` (``np.savez_compressed``, one member per
+``stream/column``) with a ``wall_time`` column in Unix seconds, so all streams
+share one time base. Video, frame index and logs are large or free-form and are
+only referenced (relative path, size, mtime) in the bundle's manifest.
+
+``np.load`` on an ``.npz`` only decompresses the members that are accessed, so
+SessionBundle.stream("ppg", ["wall_time", "ppg"]) never touches the Stroop or
+marker columns, and load_study can pull one stream out of every session
+without opening the original files.
+
+Time bases (``time_base`` of every stream in the manifest):
+    ppg            session header clock base ("unix_seconds"), or for CSV
+                   recordings the file's mtime ("approximate", see epochs.wall_clock)
+    markers        logged local time, 1 s resolution ("unix_seconds")
+    stroop_*       "approximate": the result files carry no clock, so the trials
+                   are placed 1 s apart ending at the file's mtime, which moves
+                   when a file is copied or synced
+    video_features frame index, when recordVideo.py wrote one ("unix_seconds")
+
+Usage:
+    $ python session_bundle.py                  # (re)build stale bundles under ./data
+    bundle = SessionBundle("./data/audio/participant_3_bundle.npz")
+    ppg = bundle.stream("ppg", t0=marker_time, t1=marker_time + 30)
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analyze_ppg import DATA_ROOT, load_ppg
+from epochs import STROOP_TRIAL_SECONDS, load_markers, wall_clock
+from stroop_analysis import COLUMNS as STROOP_COLUMNS
+from video_features import features_dir, load_features
+from video_index import index_path
+
+BUNDLE_VERSION = 2
+MANIFEST_KEY = "__manifest__"
+SESSION_FILE = re.compile(
+    r"participant_(?P<participant>.+?)_(?:ppg_data\.csv|ppg_session\.bin|data\.csv|video\.mp4"
+    r"|stroop_results_(?:before|after)\.csv)$")
+
+
+def bundle_path(experiment_dir, participant):
+    return os.path.join(experiment_dir, f"participant_{participant}_bundle.npz")
+
+
+def session_sources(experiment_dir, participant):
+    """Existing source files of a session: (tabular streams, referenced files)."""
+    base = os.path.join(experiment_dir, f"participant_{participant}")
+    streams = {}
+    for candidate in (f"{base}_ppg_session.bin", f"{base}_ppg_data.csv"):
+        if os.path.exists(candidate):
+            streams["ppg"] = candidate
+            break
+    for name, candidate in (("markers", f"{base}_data.csv"),
+                            ("stroop_before", f"{base}_stroop_results_before.csv"),
+                            ("stroop_after", f"{base}_stroop_results_after.csv"),
+                            ("video_features", os.path.join(features_dir(f"{base}_video.mp4"), "meta.json"))):
+        if os.path.exists(candidate):
+            streams[name] = candidate
+
+    references = {}
+    for name, candidate in (("video", f"{base}_video.mp4"),
+                            ("video_index", index_path(f"{base}_video.mp4")),
+                            ("ppg_stats", f"{base}_ppg_stats.json"),
+                            ("ffmpeg_log", os.path.join(experiment_dir, f"ffmpeg_{participant}.log"))):
+        if os.path.exists(candidate):
+            references[name] = candidate
+    for log in sorted(glob.glob(f"{glob.escape(base)}_*.log")):
+        references[os.path.basename(log)[len(os.path.basename(base)) + 1:-4]] = log
+    return streams, references
+
+
+def file_signature(path, relative_to):
+    stat = os.stat(path)
+    return {"path": os.path.relpath(path, relative_to), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+# 🔹 Stream readers: each returns {column: np.ndarray} with a wall_time column
+def read_ppg(path):
+    time, ppg, fs = load_ppg(path)
+    return {"wall_time": wall_clock(path, time), "time": time, "ppg": ppg}
+
+
+def read_markers(path):
+    markers = load_markers(path)
+    return {
+        "wall_time": markers["wall"].to_numpy(),
+        "event": markers["event"].to_numpy(dtype=str),
+        "kind": markers["kind"].to_numpy(dtype=str),
+        "label": markers["label"].to_numpy(dtype=str),
+        "cycle": markers["cycle"].fillna(-1).to_numpy(dtype=np.int64),
+    }
+
+
+def read_stroop(path):
+    trials = pd.read_csv(path, dtype=STROOP_COLUMNS, engine="c")
+    end = os.stat(path).st_mtime
+    columns = {"wall_time": end - STROOP_TRIAL_SECONDS * np.arange(len(trials), 0, -1)}
+    for name in trials.columns:
+        values = trials[name].to_numpy()
+        columns[name] = values.astype(str) if values.dtype == object else values
+    return columns
+
+
+def read_video_features(path):
+    features = load_features(os.path.dirname(path))
+    columns = {name: np.asarray(values) for name, values in features.items()}
+    if "wall_time" not in columns:
+        columns["wall_time"] = np.full(len(columns["frame"]), np.nan)
+    return columns
+
+
+def time_base(stream, path):
+    """"approximate" for streams timed from a file's mtime, "unix_seconds" for logged clocks."""
+    if stream.startswith("stroop_") or (stream == "ppg" and not path.endswith(".bin")):
+        return "approximate"
+    return "unix_seconds"
+
+
+READERS = {
+    "ppg": read_ppg,
+    "markers": read_markers,
+    "stroop_before": read_stroop,
+    "stroop_after": read_stroop,
+    "video_features": read_video_features,
+}
+
+
+def _read_manifest(path):
+    with np.load(path) as bundle:
+        return json.loads(bundle[MANIFEST_KEY].item())
+
+
+def build_bundle(experiment_dir, participant, force=False):
+    """Pack one session; skipped while every source file is unchanged. Returns (path, rebuilt)."""
+    out = bundle_path(experiment_dir, participant)
+    streams, references = session_sources(experiment_dir, participant)
+    sources = {name: file_signature(path, experiment_dir) for name, path in streams.items()}
+    if not force and os.path.exists(out):
+        try:
+            manifest = _read_manifest(out)
+            if manifest.get("version") == BUNDLE_VERSION and manifest.get("sources") == sources:
+                return out, False
+        except (OSError, KeyError, ValueError):
+            pass
+
+    members, stream_info = {}, {}
+    for name, path in streams.items():
+        columns = READERS[name](path)
+        for column, values in columns.items():
+            members[f"{name}/{column}"] = values
+        wall = columns["wall_time"]
+        finite = wall[np.isfinite(wall)]
+        stream_info[name] = {
+            "columns": list(columns),
+            "rows": len(wall),
+            "time_base": time_base(name, path),
+            "start": float(finite[0]) if len(finite) else None,
+            "end": float(finite[-1]) if len(finite) else None,
+        }
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "experiment": os.path.basename(os.path.normpath(experiment_dir)),
+        "participant": participant,
+        "time_base": "unix_seconds",
+        "streams": stream_info,
+        "sources": sources,
+        "references": {name: file_signature(path, experiment_dir) for name, path in references.items()},
+    }
+    members[MANIFEST_KEY] = np.array(json.dumps(manifest))
+    tmp = f"{out}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp, **members)
+    os.replace(tmp, out)
+    return out, True
+
+
+def discover_sessions(root=DATA_ROOT):
+    """(experiment dir, participant) for every session with at least one known file."""
+    sessions = set()
+    for experiment_dir in sorted(glob.glob(os.path.join(root, "*", ""))):
+        for path in os.listdir(experiment_dir):
+            match = SESSION_FILE.search(path)
+            if match:
+                sessions.add((os.path.normpath(experiment_dir), match.group("participant")))
+    return sorted(sessions)
+
+
+def build_all(root=DATA_ROOT, workers=None, force=False):
+    sessions = discover_sessions(root)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(build_bundle, [d for d, _ in sessions], [p for _, p in sessions],
+                                [force] * len(sessions)))
+    rebuilt = sum(1 for _, changed in results if changed)
+    print(f"✅ {len(results)} session bundles, {rebuilt} rebuilt")
+    return [path for path, _ in results]
+
+
+class SessionBundle:
+    """Lazy view of a bundle: only the members a query touches are decompressed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._npz = np.load(path)
+        self.manifest = json.loads(self._npz[MANIFEST_KEY].item())
+        self.experiment = self.manifest["experiment"]
+        self.participant = self.manifest["participant"]
+
+    @property
+    def streams(self):
+        return list(self.manifest["streams"])
+
+    def __contains__(self, stream):
+        return stream in self.manifest["streams"]
+
+    def time_base(self, stream):
+        """"unix_seconds" or "approximate" (wall_time estimated from a file's mtime)."""
+        return self.manifest["streams"][stream]["time_base"]
+
+    def reference(self, name):
+        """Absolute path of a referenced file (video, video_index, logs), or None."""
+        entry = self.manifest["references"].get(name)
+        return os.path.join(os.path.dirname(self.path), entry["path"]) if entry else None
+
+    def column(self, stream, column):
+        return self._npz[f"{stream}/{column}"]
+
+    def stream(self, stream, columns=None, t0=None, t1=None):
+        """DataFrame of a stream's ``columns`` (all by default), optionally for t0 <= wall_time <= t1."""
+        names = columns or self.manifest["streams"][stream]["columns"]
+        lo, hi = 0, self.manifest["streams"][stream]["rows"]
+        if t0 is not None or t1 is not None:
+            wall = self.column(stream, "wall_time")
+            lo = 0 if t0 is None else int(np.searchsorted(wall, t0, side="left"))
+            hi = hi if t1 is None else int(np.searchsorted(wall, t1, side="right"))
+        return pd.DataFrame({name: self.column(stream, name)[lo:hi] for name in names})
+
+    def close(self):
+        self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_study(stream, columns=None, root=DATA_ROOT):
+    """One stream from every session bundle under root, tagged with experiment and participant."""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(root, "*", "participant_*_bundle.npz"))):
+        with SessionBundle(path) as bundle:
+            if stream in bundle:
+                frame = bundle.stream(stream, columns)
+                frame.insert(0, "participant", bundle.participant)
+                frame.insert(0, "experiment", bundle.experiment)
+                frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build one compressed bundle per recording session.")
+    parser.add_argument("--root", default=DATA_ROOT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="rebuild bundles whose sources are unchanged")
+    args = parser.parse_args()
+
+    build_all(args.root, args.workers, args.force)
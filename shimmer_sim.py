@@ -0,0 +1,202 @@
+"""
+Simulated Shimmer device for running the acquisition path without hardware.
+
+SimulatedShimmer mimics the parts of pyshimmer.ShimmerBluetooth that ppg.py uses
+(initialize, set_sampling_rate, set_sensors, add_stream_callback,
+start_streaming, stop_streaming, shutdown). A background thread delivers
+packets through the registered stream callbacks, either replaying the PPG
+column of an existing participant_*_ppg_data.csv or a synthetic PPG waveform.
+Packets carry 24-bit wrapping device ticks like the real sensor, and are
+delivered at real time or N times faster.
+
+Usage:
+    From ppg.py:
+        $ python ppg.py test test sim                      # synthetic PPG, real time
+        $ python ppg.py test test sim:./data/test/participant_test_ppg_data.csv 10
+
+    As a benchmark of the buffered writer:
+        $ python shimmer_sim.py --speed 0 --seconds 10     # as fast as possible
+        $ python shimmer_sim.py --csv ./data/test/participant_test_ppg_data.csv --speed 20
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from pyshimmer import EChannelType
+
+from ppg_stream import CHANNEL_SETS, DEVICE_CLOCK_HZ, TICK_WRAP, BufferedPPGWriter
+
+BATCH = 16  # packets delivered back to back, like the Bluetooth link does
+
+
+def synthetic_ppg(fs, seconds=60.0, bpm=70.0, seed=0):
+    """PPG-like waveform: systolic and dicrotic pulses, respiration drift and noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(fs * seconds)) / fs
+    rate = bpm / 60.0 * (1.0 + 0.05 * np.sin(2 * np.pi * 0.25 * t))  # respiratory sinus arrhythmia
+    phase = np.cumsum(rate) / fs % 1.0
+    pulse = np.exp(-((phase - 0.2) ** 2) / 0.005) + 0.4 * np.exp(-((phase - 0.5) ** 2) / 0.01)
+    return 2000.0 + 300.0 * pulse + 40.0 * np.sin(2 * np.pi * 0.1 * t) + rng.normal(0.0, 8.0, len(t))
+
+
+def load_csv_signal(path):
+    """PPG column of a recording written by ppg.py in CSV mode."""
+    return np.loadtxt(path, delimiter=",", skiprows=1, usecols=1, ndmin=1)
+
+
+class SimulatedShimmer:
+    """Drop-in stand-in for ShimmerBluetooth.
+
+    Args:
+        source (str): CSV file to replay, or None for a synthetic waveform.
+        speed (float): Playback speed; 1.0 is real time, 0 delivers as fast as possible.
+        loop (bool): Restart the source when it runs out instead of stopping.
+        drop_rate (float): Fraction of packets silently skipped, to exercise gap handling.
+    """
+
+    def __init__(self, source=None, speed=1.0, loop=True, drop_rate=0.0, seed=0):
+        self.source = source
+        self.speed = speed
+        self.loop = loop
+        self.drop_rate = drop_rate
+        self.sampling_rate = 512.0
+        self.sensors = None
+        self.emitted = 0
+        self.skipped = 0
+        self._rng = np.random.default_rng(seed)
+        self._callbacks = []
+        self._signal = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Every channel any CHANNEL_SETS entry may ask for; extra keys are ignored by readers.
+        self._channels = list(dict.fromkeys(
+            ch for channel_set in CHANNEL_SETS.values() for ch in channel_set["channels"].values()))
+
+    def initialize(self):
+        pass
+
+    def shutdown(self):
+        self.stop_streaming()
+
+    def get_device_name(self):
+        return "Simulated Shimmer"
+
+    def set_sampling_rate(self, sr):
+        self.sampling_rate = float(sr)
+
+    def get_sampling_rate(self):
+        return self.sampling_rate
+
+    def set_sensors(self, sensors):
+        self.sensors = list(sensors)
+
+    def add_stream_callback(self, cb):
+        self._callbacks.append(cb)
+
+    def start_streaming(self):
+        if self.source is not None:
+            self._signal = load_csv_signal(self.source)
+        else:
+            self._signal = synthetic_ppg(self.sampling_rate)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="shimmer-sim", daemon=True)
+        self._thread.start()
+
+    def stop_streaming(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self):
+        """Block until a non-looping source has been fully delivered."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        signal = self._signal
+        n = len(signal)
+        ticks_per_sample = DEVICE_CLOCK_HZ / self.sampling_rate
+        shifts = [k * int(0.01 * self.sampling_rate) for k in range(len(self._channels))]
+        drops = self._rng.random(n) < self.drop_rate if self.drop_rate > 0 else None
+        start = time.perf_counter()
+        i = 0
+        while not self._stop.is_set():
+            if not self.loop and i >= n:
+                break
+            for j in range(i, i + BATCH):
+                if drops is not None and drops[j % n]:
+                    self.skipped += 1
+                    continue
+                pkt = {EChannelType.TIMESTAMP: int(j * ticks_per_sample) % TICK_WRAP}
+                for ch, shift in zip(self._channels, shifts):
+                    pkt[ch] = signal[(j + shift) % n]
+                for cb in self._callbacks:
+                    cb(pkt)
+                self.emitted += 1
+            i += BATCH
+            if self.speed > 0:
+                delay = start + i / (self.sampling_rate * self.speed) - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+def benchmark(source=None, speed=1.0, seconds=10.0, channel_set="ppg", drop_rate=0.0, flush_interval=0.5):
+    """Drive BufferedPPGWriter from the simulator and return throughput / drop / latency numbers."""
+    device = SimulatedShimmer(source, speed=speed, drop_rate=drop_rate)
+    device.set_sampling_rate(512.0)
+    path = os.path.join(tempfile.mkdtemp(prefix="ppg_bench_"), "bench_ppg_session.bin")
+    writer = BufferedPPGWriter(path, device.sampling_rate, "bench", "bench", channel_set,
+                               stats_path=os.path.join(os.path.dirname(path), "bench_ppg_stats.json"),
+                               capacity=int(device.sampling_rate * 30), flush_interval=flush_interval)
+    handler_ns = [0]
+
+    def timed_handler(pkt):
+        t0 = time.perf_counter_ns()
+        writer.handle_packet(pkt)
+        handler_ns[0] += time.perf_counter_ns() - t0
+
+    device.add_stream_callback(timed_handler)
+    writer.start()
+    device.start_streaming()
+    started = time.perf_counter()
+    time.sleep(seconds)
+    device.stop_streaming()
+    elapsed = time.perf_counter() - started
+    writer.stop()
+    emitted = max(device.emitted, 1)
+    worst_write = writer.stats.percentile_ns(writer.stats.write_hist, 1.0) or 0
+    return {
+        "file": path,
+        "emitted": device.emitted,
+        "written": writer.written,
+        "dropped": writer.buffer.dropped,
+        "gaps": writer.stats.gaps,
+        "packets_per_sec": device.emitted / elapsed,
+        "realtime_factor": device.emitted / elapsed / device.sampling_rate,
+        "handler_us": handler_ns[0] / emitted / 1000.0,
+        "drop_rate": writer.buffer.dropped / emitted,
+        "lost_samples": writer.stats.lost_samples,
+        "max_latency_ms": worst_write / 1e6,
+        "stats_file": writer.stats_path,
+        "bpm": writer.heart_rate.bpm if writer.heart_rate is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the buffered PPG writer against a simulated Shimmer.")
+    parser.add_argument("--csv", help="participant_*_ppg_data.csv to replay (default: synthetic PPG)")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed, 0 = as fast as possible")
+    parser.add_argument("--seconds", type=float, default=10.0, help="wall-clock run time")
+    parser.add_argument("--channel-set", default="ppg", choices=sorted(CHANNEL_SETS))
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of packets the device skips")
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    results = benchmark(args.csv, args.speed, args.seconds, args.channel_set, args.drop_rate, args.flush_interval)
+    for name, value in results.items():
+        print(f"{name:>16}: {value:.3f}" if isinstance(value, float) else f"{name:>16}: {value}")
@@ -0,0 +1,147 @@
+"""
+Study-wide aggregation of the Stroop go/no-go results written by stroop.py.
+
+Every ``data/{experiment}/participant_{id}_stroop_results_{before|after}.csv``
+becomes one row of a tidy table (experiment x participant x phase) with
+accuracy, omission / commission errors, d' and reaction-time quantiles. All
+trials are concatenated and summarised with one group-by, and the table is
+stored with each source file's mtime and size, so a rerun only reads the result
+files that are new or changed.
+
+Match trials are "go" trials (press ENTER), non-match trials are "no-go":
+    hit         go trial answered           omission    go trial missed
+    commission  no-go trial answered        correct rejection otherwise
+d' uses the log-linear correction (add 0.5 to the counts, 1 to the trial totals)
+so perfect hit or false-alarm rates stay finite.
+
+Usage:
+    $ python stroop_analysis.py                  # updates ./data/stroop_summary.csv
+    $ python stroop_analysis.py --rebuild
+"""
+
+import argparse
+import glob
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+DATA_ROOT = "./data"
+SUMMARY_FILE = "./data/stroop_summary.csv"
+RT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+KEYS = ["experiment", "participant", "phase"]
+
+FILE_PATTERN = re.compile(r"participant_(?P<participant>.+?)_stroop_results_(?P<phase>before|after)\.csv$")
+COLUMNS = {"word": str, "color": str, "match": bool, "response": bool, "correct": bool, "reaction_time": np.float64}
+
+
+def discover(root=DATA_ROOT):
+    """(path, experiment, participant, phase) for every Stroop result file under root."""
+    found = []
+    for path in sorted(glob.glob(os.path.join(root, "*", "participant_*_stroop_results_*.csv"))):
+        match = FILE_PATTERN.search(os.path.basename(path))
+        if match:
+            experiment = os.path.basename(os.path.dirname(path))
+            found.append((path, experiment, match.group("participant"), match.group("phase")))
+    return found
+
+
+def signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_trials(entry):
+    """Trials of one result file, tagged with its keys and signature."""
+    path, experiment, participant, phase = entry
+    mtime_ns, size = signature(path)
+    try:
+        trials = pd.read_csv(path, dtype=COLUMNS, engine="c")
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from e
+    trials["trial"] = np.arange(len(trials))
+    return trials.assign(experiment=experiment, participant=participant, phase=phase,
+                         file=path, mtime_ns=mtime_ns, size=size)
+
+
+def summarise(trials):
+    """One row per experiment x participant x phase from a concatenated trial table."""
+    go = trials["match"]
+    answered = trials["response"]
+    counts = pd.DataFrame({
+        **{key: trials[key] for key in KEYS + ["file", "mtime_ns", "size"]},
+        "trials": 1,
+        "go_trials": go,
+        "nogo_trials": ~go,
+        "correct": trials["correct"],
+        "hits": go & answered,
+        "omissions": go & ~answered,
+        "commissions": ~go & answered,
+    })
+    grouped = counts.groupby(KEYS, sort=True)
+    table = grouped[["file", "mtime_ns", "size"]].first()
+    table = table.join(grouped[["trials", "go_trials", "nogo_trials", "correct", "hits",
+                                "omissions", "commissions"]].sum())
+
+    table["accuracy"] = table["correct"] / table["trials"]
+    table["omission_rate"] = table["omissions"] / table["go_trials"].where(table["go_trials"] > 0)
+    table["commission_rate"] = table["commissions"] / table["nogo_trials"].where(table["nogo_trials"] > 0)
+    hit_rate = (table["hits"] + 0.5) / (table["go_trials"] + 1)
+    false_alarm_rate = (table["commissions"] + 0.5) / (table["nogo_trials"] + 1)
+    table["d_prime"] = norm.ppf(hit_rate) - norm.ppf(false_alarm_rate)
+
+    # Reaction times of correct responses (hits) only.
+    hits = trials.loc[go & answered, KEYS + ["reaction_time"]]
+    rt = hits.groupby(KEYS, sort=True)["reaction_time"]
+    table["rt_mean"] = rt.mean()
+    quantiles = rt.quantile(list(RT_QUANTILES)).unstack()
+    for q in RT_QUANTILES:
+        table[f"rt_q{int(q * 100):02d}"] = quantiles[q] if q in quantiles else np.nan
+    return table.reset_index()
+
+
+def aggregate(root=DATA_ROOT, out=SUMMARY_FILE, workers=8, rebuild=False):
+    """Update the stored summary, reading only result files that are new or changed."""
+    entries = discover(root)
+    previous = pd.DataFrame()
+    if not rebuild and os.path.exists(out):
+        previous = pd.read_csv(out, dtype={"participant": str})
+    current = {path: signature(path) for path, *_ in entries}
+
+    if not previous.empty:
+        unchanged = np.array([current.get(path) == (mtime_ns, size) for path, mtime_ns, size
+                              in previous[["file", "mtime_ns", "size"]].itertuples(index=False)], dtype=bool)
+        previous = previous[unchanged]
+    done = set(previous["file"]) if not previous.empty else set()
+    pending = [entry for entry in entries if entry[0] not in done]
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(load_trials, pending))
+        fresh = summarise(pd.concat(frames, ignore_index=True))
+        table = pd.concat([previous, fresh], ignore_index=True) if not previous.empty else fresh
+    else:
+        table = previous
+    if table.empty:
+        print(f"⚠️ No Stroop result files found under {root}.")
+        return table
+    table = table.sort_values(KEYS).reset_index(drop=True)
+    tmp = f"{out}.{os.getpid()}.tmp"
+    table.to_csv(tmp, index=False)
+    os.replace(tmp, out)
+    print(f"✅ {len(table)} Stroop runs in {out} ({len(pending)} file(s) read)")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate Stroop results for the whole study.")
+    parser.add_argument("--root", default=DATA_ROOT)
+    parser.add_argument("--out", default=SUMMARY_FILE)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the stored table and read every file")
+    args = parser.parse_args()
+
+    aggregate(args.root, args.out, args.workers, args.rebuild)
@@ -0,0 +1,213 @@
+"""
+Parallel per-frame feature extraction for recorded session videos.
+
+Each ``participant_{id}_video.mp4`` is split into chunks that start on a
+keyframe (taken from the video_index.py sidecar when there is one, otherwise
+every GOP-th frame), so a worker can seek straight to its chunk and decode it
+independently. Chunks run in a process pool and every worker writes its rows
+directly into preallocated column files, one ``.npy`` per feature, opened as
+memmaps; nothing but two thumbnails per chunk travels back to the parent.
+
+Features per frame:
+    motion                mean absolute grey-level change from the previous frame
+                          (on a downscaled thumbnail)
+    face_found            a face ROI is known (Haar cascade, re-detected every
+                          DETECT_EVERY frames, the last box is reused in between)
+    face_x/y/w/h          the ROI in full-resolution pixels
+    face_b/face_g/face_r  mean colour inside the ROI
+    wall_time             Unix seconds of the frame (only with a frame index)
+
+Motion across a chunk boundary needs the previous chunk's last frame, so each
+worker returns its first and last thumbnail and the parent fills in those rows.
+
+Usage:
+    $ python video_features.py ./data/test/participant_test_video.mp4
+    $ python video_features.py --root ./data           # every video in the study
+
+    features = load_features("./data/test/participant_test_video_features")
+    features["motion"]   # np.memmap, one value per frame
+"""
+
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from video_index import GOP, VideoIndex, index_path
+
+CHUNK_FRAMES = 900  # ~30 s at 30 fps, rounded up to whole GOPs
+THUMB_WIDTH = 160  # px, motion is computed at this width
+DETECT_EVERY = 15  # frames between face detections
+DETECT_WIDTH = 320  # px, faces are detected at this width
+COLUMNS = {
+    "frame": np.int64,
+    "motion": np.float32,
+    "face_found": np.bool_,
+    "face_x": np.int32,
+    "face_y": np.int32,
+    "face_w": np.int32,
+    "face_h": np.int32,
+    "face_b": np.float32,
+    "face_g": np.float32,
+    "face_r": np.float32,
+}
+
+
+def features_dir(video_path):
+    """participant_{id}_video_features/ next to participant_{id}_video.mp4."""
+    stem = video_path[:-4] if video_path.endswith(".mp4") else video_path
+    return f"{stem}_features"
+
+
+def keyframe_chunks(keyframes, n_frames, chunk_frames=CHUNK_FRAMES):
+    """[start, stop) frame ranges of about ``chunk_frames`` that each begin on a keyframe."""
+    keyframes = np.asarray(keyframes, dtype=np.int64)
+    if len(keyframes) == 0 or keyframes[0] != 0:
+        keyframes = np.concatenate(([0], keyframes))
+    starts = [0]
+    for key in keyframes[1:]:
+        if key - starts[-1] >= chunk_frames and key < n_frames:
+            starts.append(int(key))
+    return list(zip(starts, starts[1:] + [n_frames]))
+
+
+def video_layout(video_path):
+    """(frame count, keyframe numbers, frame index or None) of a video."""
+    sidecar = index_path(video_path)
+    if os.path.exists(sidecar):
+        index = VideoIndex(sidecar)
+        return len(index), np.flatnonzero(index.records["keyframe"]), index
+    import cv2
+
+    capture = cv2.VideoCapture(video_path)
+    n_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    # recordVideo.py encodes with a fixed GOP, so keyframes are every GOP-th frame.
+    return n_frames, np.arange(0, n_frames, GOP), None
+
+
+def open_columns(out_dir, n_frames, mode):
+    return {name: np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.npy"), mode=mode,
+                                            dtype=dtype, shape=(n_frames,) if mode == "w+" else None)
+            for name, dtype in COLUMNS.items()}
+
+
+def _thumbnail(gray):
+    import cv2
+
+    height = max(int(gray.shape[0] * THUMB_WIDTH / gray.shape[1]), 1)
+    return cv2.resize(gray, (THUMB_WIDTH, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def process_chunk(video_path, out_dir, start, stop):
+    """Decode frames [start, stop) and write their features; runs in a worker process.
+
+    Returns (start, frames decoded, first thumbnail, last thumbnail).
+    """
+    import cv2
+
+    columns = open_columns(out_dir, None, "r+")
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    capture = cv2.VideoCapture(video_path)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    first = previous = None
+    box = None
+    decoded = 0
+    for frame in range(start, stop):
+        ok, image = capture.read()
+        if not ok:
+            break
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        thumb = _thumbnail(gray)
+        if previous is None:
+            first = thumb
+        else:
+            columns["motion"][frame] = np.mean(np.abs(thumb - previous))
+        previous = thumb
+
+        if (frame - start) % DETECT_EVERY == 0:
+            scale = DETECT_WIDTH / gray.shape[1]
+            small = cv2.resize(gray, (DETECT_WIDTH, max(int(gray.shape[0] * scale), 1)))
+            faces = cascade.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+            if len(faces):
+                # Largest face, back in full-resolution pixels.
+                x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+                box = tuple(int(round(v / scale)) for v in (x, y, w, h))
+            else:
+                box = None
+        columns["frame"][frame] = frame
+        if box is not None:
+            x, y, w, h = box
+            roi = image[y:y + h, x:x + w]
+            columns["face_found"][frame] = True
+            columns["face_x"][frame], columns["face_y"][frame] = x, y
+            columns["face_w"][frame], columns["face_h"][frame] = w, h
+            (columns["face_b"][frame], columns["face_g"][frame],
+             columns["face_r"][frame]) = roi.reshape(-1, 3).mean(axis=0)
+        decoded += 1
+    capture.release()
+    for column in columns.values():
+        column.flush()
+    return start, decoded, first, previous
+
+
+def extract(video_path, workers=None, chunk_frames=CHUNK_FRAMES):
+    """Feature columns for every frame of one video, written to features_dir(video_path)."""
+    n_frames, keyframes, index = video_layout(video_path)
+    out_dir = features_dir(video_path)
+    os.makedirs(out_dir, exist_ok=True)
+    columns = open_columns(out_dir, n_frames, "w+")
+    columns["frame"][:] = -1  # marks frames that could not be decoded
+    for name in ("motion", "face_b", "face_g", "face_r"):
+        columns[name][:] = np.nan
+    for column in columns.values():
+        column.flush()
+
+    chunks = keyframe_chunks(keyframes, n_frames, chunk_frames)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(process_chunk, [video_path] * len(chunks), [out_dir] * len(chunks),
+                                [start for start, _ in chunks], [stop for _, stop in chunks]))
+
+    columns = open_columns(out_dir, None, "r+")
+    for (start, _, first, _), (previous_start, previous_count, _, previous_last) in zip(results[1:], results[:-1]):
+        # Motion of a chunk's first frame, against the previous chunk's last one if that
+        # chunk was decoded to its end.
+        if first is not None and previous_start + previous_count == start:
+            columns["motion"][start] = np.mean(np.abs(first - previous_last))
+    decoded = sum(count for _, count, _, _ in results)
+    for column in columns.values():
+        column.flush()
+
+    meta = {"video": video_path, "frames": n_frames, "decoded": decoded, "chunks": len(chunks),
+            "columns": list(COLUMNS)}
+    if index is not None:
+        np.save(os.path.join(out_dir, "wall_time.npy"), index.wall_time())
+        meta["columns"].append("wall_time")
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"✅ {decoded}/{n_frames} frames of {video_path} in {len(chunks)} chunks -> {out_dir}")
+    return out_dir
+
+
+def load_features(out_dir):
+    """Feature columns of a video as a dict of read-only memmaps."""
+    with open(os.path.join(out_dir, "meta.json")) as f:
+        meta = json.load(f)
+    return {name: np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode="r") for name in meta["columns"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame motion and face-ROI features for session videos.")
+    parser.add_argument("videos", nargs="*", help="mp4 files (default: every participant video under --root)")
+    parser.add_argument("--root", default="./data")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-frames", type=int, default=CHUNK_FRAMES)
+    args = parser.parse_args()
+
+    videos = args.videos or sorted(glob.glob(os.path.join(args.root, "*", "participant_*_video.mp4")))
+    for video in videos:
+        extract(video, args.workers, args.chunk_frames)
@@ -0,0 +1,171 @@
+"""
+Per-frame sidecar index for the videos written by recordVideo.py.
+
+recordVideo.py runs ffmpeg with the ``showinfo`` filter, which prints one line
+per frame (frame number, PTS) to stderr, and with a fixed GOP so that every
+``gop``-th frame is a keyframe. ShowinfoIndexer parses those lines as they
+arrive and appends one fixed-width record per frame to
+``participant_{id}_video_index.bin`` in the ppg_session format:
+
+    frame     frame number in the output file
+    pts       presentation timestamp in the stream time base
+    pts_time  PTS in seconds
+    host_ns   time.monotonic_ns() when ffmpeg reported the frame
+    keyframe  True for the first frame of every GOP
+
+The header's clock base converts host_ns to Unix time, the same way the PPG
+session files do, so video frames, PPG samples and audio.py markers share one
+time axis. VideoIndex maps any timestamp to the nearest frame with a binary
+search and seeks to it from the preceding keyframe instead of decoding from the
+start of the file.
+
+Usage:
+    index = VideoIndex("./data/test/participant_test_video_index.bin")
+    frame = index.frame_at_wall(marker_unix_seconds)
+    image = index.read_frame("./data/test/participant_test_video.mp4", frame)
+"""
+
+import re
+import time
+
+import numpy as np
+
+from ppg_session import SessionReader, SessionWriter
+
+GOP = 30  # frames between keyframes, passed to ffmpeg as -g
+FLUSH_EVERY = 30  # frames
+INDEX_DTYPE = np.dtype([
+    ("frame", "<i8"),
+    ("pts", "<i8"),
+    ("pts_time", "<f8"),
+    ("host_ns", "<i8"),
+    ("keyframe", "?"),
+])
+
+SHOWINFO_FRAME = re.compile(r"\bn:\s*(?P<n>\d+)\s+pts:\s*(?P<pts>-?\d+)\s+pts_time:\s*(?P<pts_time>-?[\d.]+)")
+SHOWINFO_CONFIG = re.compile(r"config in time_base:\s*(?P<time_base>\d+/\d+),\s*frame_rate:\s*(?P<frame_rate>\d+/\d+)")
+
+
+def index_path(video_path):
+    """participant_{id}_video_index.bin next to participant_{id}_video.mp4."""
+    stem = video_path[:-4] if video_path.endswith(".mp4") else video_path
+    return f"{stem}_index.bin"
+
+
+def ffmpeg_index_args(gop=GOP):
+    """Output options that make the index exact: one output frame per showinfo line, fixed GOP."""
+    return [
+        '-vf', 'showinfo',
+        '-vsync', 'passthrough',
+        '-g', str(gop),
+        '-keyint_min', str(gop),
+        '-sc_threshold', '0',
+    ]
+
+
+class ShowinfoIndexer:
+    """Turns ffmpeg showinfo stderr lines into index records.
+
+    The index file is created on the first frame, once showinfo has reported the
+    stream time base and frame rate.
+    """
+
+    def __init__(self, path, video_path, gop=GOP, **metadata):
+        self.path = path
+        self.video_path = video_path
+        self.gop = gop
+        self.metadata = metadata
+        self.config = {}
+        self.frames = 0
+        self._writer = None
+
+    def feed(self, line):
+        """Parse one stderr line; returns True if it described a frame."""
+        now = time.monotonic_ns()
+        match = SHOWINFO_FRAME.search(line)
+        if match is None:
+            config = SHOWINFO_CONFIG.search(line)
+            if config:
+                self.config = config.groupdict()
+            return False
+        if self._writer is None:
+            self._writer = SessionWriter(self.path, INDEX_DTYPE, "host_ns", video=self.video_path,
+                                         gop=self.gop, **self.config, **self.metadata)
+        n = int(match["n"])
+        self._writer.append([(n, int(match["pts"]), float(match["pts_time"]), now, n % self.gop == 0)])
+        self.frames += 1
+        if self.frames % FLUSH_EVERY == 0:
+            self._writer.flush()
+        return True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class VideoIndex:
+    """Timestamp -> frame lookups over a sidecar index file."""
+
+    def __init__(self, path):
+        self.reader = SessionReader(path)
+        self.header = self.reader.header
+        self.records = self.reader.records
+        self.gop = self.header.get("gop", GOP)
+        self._keyframes = np.flatnonzero(self.records["keyframe"]) if len(self.records) else np.zeros(0, np.int64)
+        self._frame_ns = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def frame_ns(self):
+        """Host monotonic ns of every frame, on the PTS timeline.
+
+        host_ns is when ffmpeg *reported* a frame, so it carries a variable
+        encoder/pipe delay. Frames are placed on their PTS instead, shifted by
+        the smallest observed (host_ns - PTS), i.e. the least-delayed report.
+        """
+        if self._frame_ns is None:
+            pts_ns = np.round(self.records["pts_time"] * 1e9).astype(np.int64)
+            self._frame_ns = pts_ns + int(np.min(self.records["host_ns"] - pts_ns)) if len(pts_ns) else pts_ns
+        return self._frame_ns
+
+    def nearest_frame(self, host_ns):
+        """Index of the frame closest to ``host_ns`` (scalar or array), by binary search."""
+        times = self.frame_ns
+        host_ns = np.asarray(host_ns, dtype=np.int64)
+        if len(times) < 2:
+            return np.zeros(host_ns.shape, dtype=np.int64) if host_ns.ndim else 0
+        right = np.clip(np.searchsorted(times, host_ns), 1, len(times) - 1)
+        left = right - 1
+        nearest = np.where(host_ns - times[left] <= times[right] - host_ns, left, right)
+        return nearest if nearest.ndim else int(nearest)
+
+    def frame_at_wall(self, wall_seconds):
+        """Nearest frame to Unix time(s), e.g. audio.py marker times."""
+        return self.nearest_frame(self.reader.wall_to_host_ns(wall_seconds))
+
+    def wall_time(self, frames=None):
+        """Unix seconds of the given frames (all frames by default)."""
+        times = self.frame_ns if frames is None else self.frame_ns[frames]
+        return self.reader.wall_time(times)
+
+    def keyframe_before(self, frame):
+        """Last keyframe at or before ``frame``: where decoding has to start."""
+        position = np.searchsorted(self._keyframes, frame, side="right") - 1
+        return int(self._keyframes[max(position, 0)]) if len(self._keyframes) else 0
+
+    def read_frame(self, video_path, frame):
+        """Decode one frame, starting from the preceding keyframe. Returns a BGR image or None."""
+        import cv2
+
+        capture = cv2.VideoCapture(video_path)
+        try:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, self.keyframe_before(frame))
+            for _ in range(frame - self.keyframe_before(frame)):
+                if not capture.grab():
+                    return None
+            ok, image = capture.read()
+            return image if ok else None
+        finally:
+            capture.release()